@@ -0,0 +1,167 @@
+"""
+Persistent cache of LLM agent outputs, keyed by normalized query.
+
+Searching and curating each cost at least one Gemini call. Queries that only
+differ in case, whitespace or punctuation ("Monet!" vs "  monet") are answered
+from this cache instead. Entries are stored in SQLite, so they survive restarts,
+and are keyed on the kind of output ("search", "curate"), the normalized query
+and optionally the model that produced them, so switching models doesn't serve
+answers from the old one.
+
+Configuration (environment variables):
+  - AGENT_CACHE_PATH: location of the SQLite database (default data/agent_cache.sqlite3)
+  - AGENT_CACHE_TTL: seconds an output is reused (default 7 days)
+  - AGENT_CACHE_KEY_MODEL: include the model name in the key (default true)
+"""
+
+import os
+import re
+import sqlite3
+import time
+from typing import Awaitable, Callable, ContextManager, Optional, TypeVar
+
+from pydantic import BaseModel
+
+import db
+from workers import run_in_worker
+
+T = TypeVar("T", bound=BaseModel)
+
+AGENT_CACHE_PATH = os.getenv("AGENT_CACHE_PATH", "data/agent_cache.sqlite3")
+AGENT_CACHE_TTL = float(os.getenv("AGENT_CACHE_TTL", 60 * 60 * 24 * 7))
+AGENT_CACHE_KEY_MODEL = os.getenv("AGENT_CACHE_KEY_MODEL", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agent_cache (
+    kind TEXT NOT NULL,
+    query TEXT NOT NULL,
+    model TEXT NOT NULL,
+    output TEXT NOT NULL,
+    created REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, query, model)
+);
+CREATE TABLE IF NOT EXISTS agent_cache_stats (
+    kind TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase the query and drop punctuation and extra whitespace."""
+    return " ".join(_PUNCTUATION.sub(" ", query.casefold()).split())
+
+
+def connect() -> ContextManager[sqlite3.Connection]:
+    """Open the cache, creating the schema on first use."""
+    return db.connect(AGENT_CACHE_PATH, SCHEMA)
+
+
+def _key(kind: str, query: str, model: str) -> tuple[str, str, str]:
+    return kind, normalize_query(query), model if AGENT_CACHE_KEY_MODEL else ""
+
+
+def _count(connection: sqlite3.Connection, kind: str, column: str) -> None:
+    connection.execute(
+        f"""
+        INSERT INTO agent_cache_stats (kind, {column}) VALUES (?, 1)
+        ON CONFLICT(kind) DO UPDATE SET {column} = {column} + 1
+        """,
+        (kind,),
+    )
+
+
+def lookup(kind: str, query: str, model: str) -> Optional[str]:
+    """The cached output (as JSON) for a query, counting the hit or miss."""
+    key = _key(kind, query, model)
+    with connect() as connection:
+        row = connection.execute(
+            "SELECT output FROM agent_cache"
+            " WHERE kind = ? AND query = ? AND model = ? AND created > ?",
+            (*key, time.time() - AGENT_CACHE_TTL),
+        ).fetchone()
+        if row is None:
+            _count(connection, kind, "misses")
+            return None
+        connection.execute(
+            "UPDATE agent_cache SET hits = hits + 1"
+            " WHERE kind = ? AND query = ? AND model = ?",
+            key,
+        )
+        _count(connection, kind, "hits")
+        return row["output"]
+
+
+def store(kind: str, query: str, model: str, output: str) -> None:
+    """Store an output (as JSON) for a query, replacing any previous one."""
+    with connect() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO agent_cache (kind, query, model, output, created)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (*_key(kind, query, model), output, time.time()),
+        )
+
+
+def stats() -> dict[str, dict]:
+    """Hits, misses, hit rate and number of stored outputs per kind."""
+    with connect() as connection:
+        entries = dict(
+            connection.execute("SELECT kind, count(*) FROM agent_cache GROUP BY kind")
+        )
+        result = {}
+        for row in connection.execute("SELECT kind, hits, misses FROM agent_cache_stats"):
+            lookups = row["hits"] + row["misses"]
+            result[row["kind"]] = {
+                "hits": row["hits"],
+                "misses": row["misses"],
+                "hit_rate": round(row["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": entries.get(row["kind"], 0),
+            }
+        return result
+
+
+async def get_cached(kind: str, query: str, model: str, output_type: type[T]) -> Optional[T]:
+    """The cached output for a query, or None on a miss."""
+    try:
+        output = await run_in_worker(lookup, kind, query, model)
+    except sqlite3.Error as e:
+        print(f"Agent cache lookup failed: {e}")
+        return None
+    return output_type.model_validate_json(output) if output is not None else None
+
+
+async def put_cached(kind: str, query: str, model: str, output: BaseModel) -> None:
+    try:
+        await run_in_worker(store, kind, query, model, output.model_dump_json())
+    except sqlite3.Error as e:
+        print(f"Agent cache store failed: {e}")
+
+
+async def cached_agent_output(
+    kind: str,
+    query: str,
+    model: str,
+    output_type: type[T],
+    produce: Callable[[], Awaitable[Optional[T]]],
+    cacheable: Optional[Callable[[T], bool]] = None,
+) -> Optional[T]:
+    """
+    Return the cached output for a query, or call `produce` and cache its result.
+    A None result (the agent failed) is not cached, nor is a result `cacheable`
+    rejects (e.g. one the agent only partly completed).
+    """
+    cached = await get_cached(kind, query, model, output_type)
+    if cached is not None:
+        return cached
+    output = await produce()
+    if output is not None and (cacheable is None or cacheable(output)):
+        await put_cached(kind, query, model, output)
+    return output
@@ -1,7 +1,21 @@
-from datetime import datetime
+import asyncio
+import os
+import time
+from datetime import date, datetime, timedelta
+import apod_archive
 from schema import Category, FeedItem, Feed
-import httpx
-from functools import lru_cache
+from http_client import get_async_client
+from workers import run_in_worker
+
+# Minimum number of seconds between two syncs of the local APOD archive
+APOD_ARCHIVE_REFRESH = float(os.getenv("APOD_ARCHIVE_REFRESH", 6 * 60 * 60))
+
+# Seconds to wait before fetching the years a backfill failed to fetch again
+APOD_BACKFILL_RETRY = float(os.getenv("APOD_BACKFILL_RETRY", 5 * 60))
+
+_sync_lock = asyncio.Lock()
+_backfill_task: asyncio.Task | None = None
+_backfilled = False
 
 
 def get_apod_categories() -> list[Category]:
@@ -34,77 +48,182 @@ async def get_apod_feed(year: str = "2025", hd: bool = False) -> Feed:
         current_year = datetime.now().year
         start_date = f"{current_year}-01-01"
 
-    # Construct the API URL
-    api_url = f"https://apod.ellanan.com/api?start_date={start_date}&limit=365"
+    # Fetch the JSON data. Failures are raised, so a cached feed is served instead
+    apod_items = await fetch_apod_entries(start_date)
 
-    # Fetch the JSON data
-    async with httpx.AsyncClient() as client:
-        response = await client.get(api_url)
+    # Convert to FeedItem format, skipping items without images
+    items = [
+        apod_entry_to_feed_item(item, hd)
+        for item in apod_items
+        if item.get("url") and item.get("media_type") == "image"
+    ]
 
-    if response.status_code != 200:
-        return Feed(items=[], category=Category(id=str(year), name=str(year)))
+    return Feed(items=items, category=Category(id=str(year), name=str(year)))
 
-    # Parse the JSON data
-    apod_items = response.json()
 
-    # Convert to FeedItem format
-    items = []
-    for item in apod_items:
-        # Skip items without images or with media_type other than image
-        if "url" not in item or item.get("media_type") != "image":
-            continue
+async def fetch_apod_entries(start_date: str, limit: int = 365) -> list[dict]:
+    """Fetch raw APOD API entries from `start_date` (YYYY-MM-DD) onwards."""
+    api_url = f"https://apod.ellanan.com/api?start_date={start_date}&limit={limit}"
+    response = await get_async_client().get(api_url)
+    response.raise_for_status()
+    return response.json()
 
-        # For APOD, the link should go to the official NASA APOD page
-        date_parts = item["date"].split("-")
-        link = f"https://apod.nasa.gov/apod/ap{date_parts[0][2:]}{date_parts[1]}{date_parts[2]}.html"
 
-        description = item.get("explanation", "")
+def apod_entry_to_feed_item(item: dict, hd: bool = False) -> FeedItem:
+    """Convert a raw APOD entry (from the API or the local archive) to a FeedItem."""
+    # For APOD, the link should go to the official NASA APOD page
+    date_parts = item["date"].split("-")
+    link = f"https://apod.nasa.gov/apod/ap{date_parts[0][2:]}{date_parts[1]}{date_parts[2]}.html"
 
-        items.append(
-            FeedItem(
-                id=item.get("date"),
-                title=item.get("title", "No Title"),
-                image_url=item["hdurl"] if ("hdurl" in item and hd) else item["url"],
-                link=link,
-                description=description,
-            )
-        )
+    return FeedItem(
+        id=item.get("date"),
+        title=item.get("title") or "No Title",
+        image_url=item["hdurl"] if (item.get("hdurl") and hd) else item["url"],
+        link=link,
+        description=item.get("explanation", ""),
+    )
 
-    return Feed(items=items, category=Category(id=str(year), name=str(year)))
+
+async def _backfill_apod_archive() -> list[str]:
+    """
+    Fetch every year the archive doesn't have yet, a few at a time.
+
+    Returns:
+        The years that failed and still have to be fetched.
+    """
+    pending = await run_in_worker(apod_archive.pending_years)
+    if pending is None:
+        pending = [category.id for category in get_apod_categories()]
+    if not pending:
+        return []
+    semaphore = asyncio.Semaphore(4)
+
+    async def fetch_year(year: str) -> list[dict]:
+        async with semaphore:
+            return await fetch_apod_entries(f"{year}-01-01", limit=366)
+
+    years = await asyncio.gather(*[fetch_year(year) for year in pending], return_exceptions=True)
+    entries = []
+    failed = []
+    for year, result in zip(pending, years):
+        if isinstance(result, Exception):
+            print(f"Failed to backfill APOD {year}: {result}")
+            failed.append(year)
+        else:
+            entries += result
+    await run_in_worker(apod_archive.store_entries, entries)
+    await run_in_worker(apod_archive.set_pending_years, failed)
+    return failed
+
+
+async def _run_apod_backfill() -> None:
+    """Backfill the archive, retrying failed years until none are left."""
+    global _backfilled
+    while True:
+        try:
+            failed = await _backfill_apod_archive()
+        except Exception as e:
+            print(f"Failed to backfill APOD archive: {e}")
+        else:
+            if not failed:
+                _backfilled = True
+                return
+        await asyncio.sleep(APOD_BACKFILL_RETRY)
+
+
+def apod_archive_backfilled() -> bool:
+    """Whether the archive has every year, so searches see the whole of APOD."""
+    return _backfilled
+
+
+def start_apod_backfill() -> None:
+    """Start backfilling the archive in the background, unless it is done or running."""
+    global _backfill_task
+    if _backfilled or (_backfill_task is not None and not _backfill_task.done()):
+        return
+    _backfill_task = asyncio.create_task(_run_apod_backfill())
+
+
+async def sync_apod_archive(force: bool = False) -> int:
+    """
+    Fetch the APOD entries newer than the latest one in the local archive.
+
+    Syncs are skipped if the last one happened less than APOD_ARCHIVE_REFRESH
+    seconds ago, unless `force` is set, and until the backfill (see
+    `start_apod_backfill`) has fetched every year.
+
+    Returns:
+        The number of entries written.
+    """
+    async with _sync_lock:
+        if (
+            not force
+            and time.time() - await run_in_worker(apod_archive.last_synced)
+            < APOD_ARCHIVE_REFRESH
+        ):
+            return 0
+
+        if await run_in_worker(apod_archive.pending_years) != []:
+            return 0
+
+        latest = await run_in_worker(apod_archive.latest_date)
+        if latest is None:
+            return 0
+        entries = []
+        start = date.fromisoformat(latest) + timedelta(days=1)
+        while start <= date.today():
+            page = await fetch_apod_entries(start.isoformat())
+            page = [entry for entry in page if entry.get("date", "") > latest]
+            if not page:
+                break
+            entries += page
+            start = date.fromisoformat(max(entry["date"] for entry in page)) + timedelta(days=1)
+
+        written = await run_in_worker(apod_archive.store_entries, entries)
+        await run_in_worker(apod_archive.mark_synced)
+        return written
 
 
 async def search_apod(
-    query: str, hd: bool = False, category: str | None = None
+    query: str,
+    hd: bool = False,
+    category: str | None = None,
+    start_date: str | None = None,
+    end_date: str | None = None,
 ) -> Feed:
     """
     Search for astronomy images in APOD based on a query.
 
+    Searches the local APOD archive (see `apod_archive`), which is synced
+    incrementally first. Results are ranked by relevance. The first search
+    starts backfilling the archive in the background and only sees the years
+    fetched so far.
+
     Args:
         query: The query to search for.
         hd: Whether to get high-definition images.
-        category: The category to search for.
+        category: Optional year to restrict the search to.
+        start_date: Optional inclusive start date (YYYY-MM-DD).
+        end_date: Optional inclusive end date (YYYY-MM-DD).
 
     Returns:
         A Feed instance containing the images.
     """
-    items: list[FeedItem] = []
-    results = []
-    if category:
-        items += (await get_apod_feed(category, hd)).items
-    else:
-        # If no category is specified, search through all categories
-        categories = get_apod_categories()
-        for _category in categories:
-            items += (await get_apod_feed(_category.id, hd)).items
-
-    for item in items:
-        if (query.lower() in item.title.lower()) or (
-            item.description and query.lower() in item.description.lower()
-        ):
-            results.append(item)
+    start_apod_backfill()
+    try:
+        await sync_apod_archive()
+    except Exception as e:
+        # Search whatever is already in the archive
+        print(f"Failed to sync APOD archive: {e}")
+
+    if category and category.isdigit():
+        start_date = max(start_date or "", f"{category}-01-01")
+        end_date = min(end_date or "9999", f"{category}-12-31")
+
+    entries = await run_in_worker(apod_archive.search, query, start_date, end_date)
 
     return Feed(
-        items=results,
+        items=[apod_entry_to_feed_item(entry, hd) for entry in entries],
         category=Category(id=f"search:{query}", name=f"Search results for '{query}'"),
     )
 
@@ -0,0 +1,173 @@
+"""
+Persistent local index of the Astronomy Picture of the Day archive.
+
+Entries are stored in SQLite with an FTS5 full-text index over the title and
+explanation, so searching the whole archive is a local, ranked query instead of
+one HTTP request per year. The archive is filled by `apod.start_apod_backfill`
+and kept up to date by `apod.sync_apod_archive`; this module only deals with
+storage.
+
+Configuration (environment variables):
+  - APOD_ARCHIVE_PATH: location of the SQLite database (default data/apod_archive.sqlite3)
+"""
+
+import os
+import sqlite3
+import time
+from typing import ContextManager, Optional
+
+import db
+
+APOD_ARCHIVE_PATH = os.getenv("APOD_ARCHIVE_PATH", "data/apod_archive.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS apod (
+    date TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    explanation TEXT,
+    url TEXT,
+    hdurl TEXT,
+    media_type TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS apod_fts USING fts5(
+    title, explanation, content='apod', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS apod_ai AFTER INSERT ON apod BEGIN
+    INSERT INTO apod_fts(rowid, title, explanation) VALUES (new.rowid, new.title, new.explanation);
+END;
+CREATE TRIGGER IF NOT EXISTS apod_ad AFTER DELETE ON apod BEGIN
+    INSERT INTO apod_fts(apod_fts, rowid, title, explanation) VALUES ('delete', old.rowid, old.title, old.explanation);
+END;
+CREATE TRIGGER IF NOT EXISTS apod_au AFTER UPDATE ON apod BEGIN
+    INSERT INTO apod_fts(apod_fts, rowid, title, explanation) VALUES ('delete', old.rowid, old.title, old.explanation);
+    INSERT INTO apod_fts(rowid, title, explanation) VALUES (new.rowid, new.title, new.explanation);
+END;
+CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def connect() -> ContextManager[sqlite3.Connection]:
+    """Open the archive, creating the schema on first use."""
+    return db.connect(APOD_ARCHIVE_PATH, SCHEMA)
+
+
+def store_entries(entries: list[dict]) -> int:
+    """Insert or update raw APOD API entries. Returns the number of entries written."""
+    rows = [
+        (
+            entry["date"],
+            entry.get("title", "No Title"),
+            entry.get("explanation", ""),
+            entry.get("url"),
+            entry.get("hdurl"),
+            entry.get("media_type"),
+        )
+        for entry in entries
+        if entry.get("date")
+    ]
+    with connect() as connection:
+        connection.executemany(
+            """
+            INSERT INTO apod (date, title, explanation, url, hdurl, media_type)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(date) DO UPDATE SET
+                title = excluded.title,
+                explanation = excluded.explanation,
+                url = excluded.url,
+                hdurl = excluded.hdurl,
+                media_type = excluded.media_type
+            """,
+            rows,
+        )
+    return len(rows)
+
+
+def latest_date() -> Optional[str]:
+    """The most recent date in the archive (YYYY-MM-DD), or None if it is empty."""
+    with connect() as connection:
+        return connection.execute("SELECT max(date) FROM apod").fetchone()[0]
+
+
+def last_synced() -> float:
+    """Unix time of the last successful sync, or 0 if the archive was never synced."""
+    with connect() as connection:
+        row = connection.execute(
+            "SELECT value FROM sync_state WHERE key = 'last_synced'"
+        ).fetchone()
+    return float(row[0]) if row else 0.0
+
+
+def mark_synced() -> None:
+    with connect() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('last_synced', ?)",
+            (str(time.time()),),
+        )
+
+
+def pending_years() -> Optional[list[str]]:
+    """Years the backfill still has to fetch, or None if it never ran."""
+    with connect() as connection:
+        row = connection.execute(
+            "SELECT value FROM sync_state WHERE key = 'pending_years'"
+        ).fetchone()
+    if row is None:
+        return None
+    return row[0].split(",") if row[0] else []
+
+
+def set_pending_years(years: list[str]) -> None:
+    with connect() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('pending_years', ?)",
+            (",".join(years),),
+        )
+
+
+def search(
+    query: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: int = 500,
+) -> list[dict]:
+    """
+    Search the archive for image entries, best matches first.
+
+    Title matches are weighted above matches in the explanation. An empty query
+    returns the entries in the date range, newest first.
+
+    Args:
+        query: Free text to search for.
+        start_date: Optional inclusive lower bound (YYYY-MM-DD).
+        end_date: Optional inclusive upper bound (YYYY-MM-DD).
+        limit: Maximum number of entries to return.
+
+    Returns:
+        A list of raw entries (date, title, explanation, url, hdurl, media_type).
+    """
+    date_filter = (
+        "a.media_type = 'image' AND a.url IS NOT NULL"
+        " AND (:start_date IS NULL OR a.date >= :start_date)"
+        " AND (:end_date IS NULL OR a.date <= :end_date)"
+    )
+    params = {
+        "query": db.fts_query(query),
+        "start_date": start_date,
+        "end_date": end_date,
+        "limit": limit,
+    }
+    if params["query"]:
+        sql = f"""
+            SELECT a.* FROM apod_fts JOIN apod a ON a.rowid = apod_fts.rowid
+            WHERE apod_fts MATCH :query AND {date_filter}
+            ORDER BY bm25(apod_fts, 10.0, 1.0)
+            LIMIT :limit
+        """
+    else:
+        sql = f"""
+            SELECT a.* FROM apod a WHERE {date_filter}
+            ORDER BY a.date DESC
+            LIMIT :limit
+        """
+    with connect() as connection:
+        return [dict(row) for row in connection.execute(sql, params)]
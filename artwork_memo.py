@@ -0,0 +1,138 @@
+"""
+Persistent memo of artworks the Detail Researcher has already found.
+
+Curated stories keep asking for the same famous works ("The Starry Night", "The
+Great Wave off Kanagawa"). Once the researcher has resolved a (title, artist)
+pair to a FeedItem, it is stored here in SQLite and reused for later stories
+instead of running the agent again. Works are looked up by normalized title
+and artist: titles by the same artist are matched fuzzily, so "Starry Night" by
+"van Gogh" finds "The Starry Night" by "Vincent van Gogh". Without an artist,
+only a title that a single memoized work has is matched.
+
+Configuration (environment variables):
+  - ARTWORK_MEMO_PATH: location of the SQLite database (default data/artwork_memo.sqlite3)
+  - ARTWORK_MEMO_CUTOFF: minimum similarity (0-1) of two titles to be considered
+    the same artwork (default 0.85)
+"""
+
+import difflib
+import os
+import sqlite3
+import time
+from typing import ContextManager, Optional
+
+import db
+from agent_cache import normalize_query
+from schema import FeedItem
+from workers import run_in_worker
+
+ARTWORK_MEMO_PATH = os.getenv("ARTWORK_MEMO_PATH", "data/artwork_memo.sqlite3")
+ARTWORK_MEMO_CUTOFF = float(os.getenv("ARTWORK_MEMO_CUTOFF", 0.85))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artworks (
+    title TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    surname TEXT NOT NULL,
+    item TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (title, artist)
+);
+CREATE INDEX IF NOT EXISTS artworks_surname ON artworks (surname);
+"""
+
+# Leading articles that don't tell two titles apart
+_ARTICLES = ("the ", "a ", "an ")
+
+
+def normalize_title(title: str) -> str:
+    title = normalize_query(title)
+    for article in _ARTICLES:
+        if title.startswith(article):
+            return title[len(article) :]
+    return title
+
+
+def _same_artist(artist: str, other: str) -> bool:
+    """
+    Whether two normalized artist names are the same person, as far as one name
+    ends with the other: "van gogh" is "vincent van gogh", "monet" is "claude monet".
+    """
+    words, other_words = artist.split(), other.split()
+    shorter, longer = sorted((words, other_words), key=len)
+    return bool(shorter) and longer[len(longer) - len(shorter) :] == shorter
+
+
+def connect() -> ContextManager[sqlite3.Connection]:
+    """Open the memo, creating the schema on first use."""
+    return db.connect(ARTWORK_MEMO_PATH, SCHEMA)
+
+
+def lookup(title: str, artist: Optional[str]) -> Optional[FeedItem]:
+    """
+    The memoized item for an artwork.
+
+    With an artist, the works by the same artist (see `_same_artist`) and the
+    ones memoized without an artist are considered: an exact match on the
+    normalized title, otherwise the closest similar title. Without an artist,
+    only an exact title match is returned, and only if no other artist has a
+    work of that title.
+    """
+    title = normalize_title(title)
+    artist = normalize_query(artist or "")
+    with connect() as connection:
+        if not artist:
+            rows = connection.execute(
+                "SELECT item FROM artworks WHERE title = ? LIMIT 2", (title,)
+            ).fetchall()
+            return FeedItem.model_validate_json(rows[0]["item"]) if len(rows) == 1 else None
+        # Works without an artist first, so ones by the artist replace them
+        rows = connection.execute(
+            "SELECT title, artist, item FROM artworks"
+            " WHERE surname = ? OR artist = '' ORDER BY artist != ''",
+            (artist.split()[-1],),
+        ).fetchall()
+    items = {
+        row["title"]: row["item"]
+        for row in rows
+        if not row["artist"] or _same_artist(artist, row["artist"])
+    }
+    if title in items:
+        return FeedItem.model_validate_json(items[title])
+    matches = difflib.get_close_matches(title, items, n=1, cutoff=ARTWORK_MEMO_CUTOFF)
+    return FeedItem.model_validate_json(items[matches[0]]) if matches else None
+
+
+def remember(title: str, artist: Optional[str], item: FeedItem) -> None:
+    """Store the item found for an artwork."""
+    artist = normalize_query(artist or item.artist_name or "")
+    with connect() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO artworks (title, artist, surname, item, updated)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (
+                normalize_title(title),
+                artist,
+                artist.split()[-1] if artist else "",
+                item.model_dump_json(),
+                time.time(),
+            ),
+        )
+
+
+async def recall_artwork(title: str, artist: Optional[str]) -> Optional[FeedItem]:
+    """The memoized item for an artwork, or None if it wasn't researched before."""
+    # The memo only saves research, so any failure (e.g. an unwritable directory,
+    # or a stored item the FeedItem model no longer accepts) falls through to it
+    try:
+        return await run_in_worker(lookup, title, artist)
+    except Exception as e:
+        print(f"Artwork memo lookup failed: {e}")
+        return None
+
+
+async def remember_artwork(title: str, artist: Optional[str], item: FeedItem) -> None:
+    try:
+        await run_in_worker(remember, title, artist, item)
+    except Exception as e:
+        print(f"Artwork memo store failed: {e}")
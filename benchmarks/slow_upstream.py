@@ -0,0 +1,149 @@
+"""
+Latency of unaffected feed endpoints while one upstream is artificially slow.
+
+All upstream hosts are replaced by an in-process mock transport. reddit.com is
+made to respond after `--slow` seconds, and a steady stream of requests to
+/api/reddit/feed keeps it busy. Meanwhile /api/apod/feed and
+/api/thisiscolossal/feed are requested repeatedly and their latency percentiles
+are reported. With blocking fetchers, those percentiles jump to roughly the slow
+upstream's delay; with async fetchers they stay in the low milliseconds.
+
+Usage:
+    python benchmarks/slow_upstream.py [--slow 2.0] [--requests 200]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SEARCH_TOKEN", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+# The mocked feeds must not end up in the app's real local state under data/,
+# where they would be served on its next start
+STATE_DIR = tempfile.mkdtemp(prefix="bijukaru-benchmark-")
+for name, filename in {
+    "CATALOG_PATH": "catalog.sqlite3",
+    "FEED_STORE_PATH": "feed_store.sqlite3",
+    "APOD_ARCHIVE_PATH": "apod_archive.sqlite3",
+    "PLACEHOLDER_PATH": "placeholders.sqlite3",
+    "AGENT_CACHE_PATH": "agent_cache.sqlite3",
+    "ARTWORK_MEMO_PATH": "artwork_memo.sqlite3",
+    "IMAGE_CACHE_DIR": "image_cache",
+}.items():
+    os.environ[name] = os.path.join(STATE_DIR, filename)
+
+import http_client  # noqa: E402
+
+SLOW_HOSTS = {"www.reddit.com"}
+
+APOD_PAYLOAD = orjson.dumps(
+    [
+        {
+            "date": f"2024-01-{day:02d}",
+            "title": f"Picture {day}",
+            "explanation": "A galaxy far away.",
+            "url": f"https://apod.nasa.gov/apod/image/{day}.jpg",
+            "media_type": "image",
+        }
+        for day in range(1, 29)
+    ]
+)
+
+COLOSSAL_PAYLOAD = b"""<?xml version="1.0"?>
+<rss xmlns:content="http://purl.org/rss/1.0/modules/content/"><channel>
+<item><title>Post</title><link>https://www.thisiscolossal.com/2024/01/post/</link>
+<description>&lt;p&gt;Text&lt;/p&gt;</description>
+<content:encoded><![CDATA[<p><img src="https://example.com/a.jpg"></p>]]></content:encoded></item>
+</channel></rss>"""
+
+REDDIT_PAYLOAD = orjson.dumps({"kind": "Listing", "data": {"children": []}})
+
+
+def make_handler(slow: float):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        if host in SLOW_HOSTS:
+            await asyncio.sleep(slow)
+        if "reddit" in host:
+            return httpx.Response(200, content=REDDIT_PAYLOAD)
+        if "apod" in host:
+            return httpx.Response(200, content=APOD_PAYLOAD)
+        if "colossal" in host:
+            return httpx.Response(200, content=COLOSSAL_PAYLOAD)
+        return httpx.Response(200, content=b"<rss></rss>")
+
+    return handler
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(slow: float, n_requests: int) -> None:
+    http_client._async_client = httpx.AsyncClient(
+        transport=httpx.MockTransport(make_handler(slow))
+    )
+
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    # Bypass the response cache so every request reaches the fetchers
+    headers = {"Cache-Control": "no-cache"}
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", headers=headers
+    ) as client:
+        stop = asyncio.Event()
+
+        async def keep_slow_upstream_busy():
+            while not stop.is_set():
+                await client.get("/api/reddit/feed", params={"category": "art"})
+
+        slow_tasks = [asyncio.create_task(keep_slow_upstream_busy()) for _ in range(8)]
+        await asyncio.sleep(0.1)
+
+        latencies: dict[str, list[float]] = {
+            "/api/apod/feed": [],
+            "/api/thisiscolossal/feed": [],
+        }
+        for i in range(n_requests):
+            for path, samples in latencies.items():
+                start = time.perf_counter()
+                params = {"category": str(i) if "apod" in path else "all-posts"}
+                response = await client.get(path, params=params)
+                samples.append((time.perf_counter() - start) * 1000)
+                response.raise_for_status()
+
+        stop.set()
+        await asyncio.gather(*slow_tasks)
+
+    print(f"Slow upstream: {', '.join(SLOW_HOSTS)} (+{slow:.1f}s per request)")
+    for path, samples in latencies.items():
+        print(
+            f"{path:<28} n={len(samples):<5} "
+            f"p50={statistics.median(samples):7.1f}ms "
+            f"p99={percentile(samples, 99):7.1f}ms "
+            f"max={max(samples):7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--slow", type=float, default=2.0, help="Upstream delay in seconds.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint.")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.slow, args.requests))
+    finally:
+        shutil.rmtree(STATE_DIR, ignore_errors=True)
@@ -0,0 +1,90 @@
+"""
+Cold-start time of the app: how long `import main` takes with the network disabled.
+
+Each run imports `main` in a fresh interpreter in which every socket connection
+and DNS lookup raises, so any network I/O at import time shows up as a failure
+instead of as a slow start. The median over several runs is printed, and with
+`--record` appended to a JSON Lines history file together with the current git
+commit, so the number can be tracked over time.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--record benchmarks/startup_history.jsonl]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_WITHOUT_NETWORK = """
+import socket, time
+
+def no_network(*args, **kwargs):
+    raise OSError("network access during startup")
+
+socket.socket.connect = no_network
+socket.create_connection = no_network
+socket.getaddrinfo = no_network
+
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+
+def measure_once() -> float:
+    env = {**os.environ, "SEARCH_TOKEN": "benchmark", "GEMINI_API_KEY": "benchmark"}
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_WITHOUT_NETWORK],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing main failed without network:\n{result.stderr}")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def git_commit() -> str:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+    )
+    return result.stdout.strip()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh imports.")
+    parser.add_argument(
+        "--record", metavar="PATH", help="Append the result to this JSON Lines file."
+    )
+    args = parser.parse_args()
+
+    samples = [measure_once() for _ in range(args.runs)]
+    median = statistics.median(samples)
+    print(
+        f"import main: median={median * 1000:.0f}ms "
+        f"min={min(samples) * 1000:.0f}ms max={max(samples) * 1000:.0f}ms (n={len(samples)})"
+    )
+
+    if args.record:
+        with open(args.record, "a") as f:
+            f.write(
+                json.dumps(
+                    {
+                        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "commit": git_commit(),
+                        "median_s": round(median, 4),
+                        "min_s": round(min(samples), 4),
+                        "max_s": round(max(samples), 4),
+                        "runs": len(samples),
+                    }
+                )
+                + "\n"
+            )
@@ -0,0 +1,293 @@
+"""
+Shared in-process cache for the media source modules and the API responses.
+
+Entries expire after a per-source TTL, and the cache as a whole is kept under a
+byte budget and an entry count by evicting the least recently used entries.
+Concurrent misses for the same key, from any thread or event loop, are
+coalesced into a single upstream fetch whose result is shared by every caller.
+
+Without Redis, `FeedCacheBackend` is also the fastapi_cache backend, so the
+feeds cached by `feeds` and the responses cached by @cache share the same
+budget. Their keys come from requests (search terms, date ranges, any
+subreddit), so an unbounded store would grow with every new one.
+
+Configuration (environment variables):
+  - FEED_CACHE_MAX_BYTES: total size budget of the cache (default 64 MiB)
+  - FEED_CACHE_MAX_ENTRIES: maximum number of entries (default 10000)
+  - FEED_CACHE_TTL_<NAMESPACE>: TTL in seconds for one namespace, overriding the
+    default given in code, e.g. FEED_CACHE_TTL_WIKIART_POPULAR_ARTISTS=600
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from functools import wraps
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar
+
+import orjson
+from fastapi_cache.types import Backend
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+
+@dataclass
+class _Entry:
+    value: Any
+    namespace: str
+    size: int
+    expires_at: float
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory footprint of a cached value, as its JSON size in bytes."""
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, BaseModel):
+        return len(value.__pydantic_serializer__.to_json(value))
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], BaseModel):
+        return sum(estimate_size(item) for item in value)
+    try:
+        return len(orjson.dumps(value))
+    except TypeError:
+        return sys.getsizeof(value)
+
+
+class FeedCache:
+    """A TTL- and size-aware LRU cache with request coalescing."""
+
+    def __init__(self, max_bytes: int, max_entries: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._in_flight: dict[Hashable, Future] = {}
+        self._stats: dict[str, CacheStats] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _namespace_stats(self, namespace: str) -> CacheStats:
+        if namespace not in self._stats:
+            self._stats[namespace] = CacheStats()
+        return self._stats[namespace]
+
+    def _remove(self, key: Hashable) -> _Entry:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        stats = self._namespace_stats(entry.namespace)
+        stats.entries -= 1
+        stats.bytes -= entry.size
+        return entry
+
+    def _lookup(self, namespace: str, key: Hashable) -> tuple[bool, Any]:
+        """Must be called with the lock held."""
+        entry = self._entry(namespace, key)
+        return (False, None) if entry is None else (True, entry.value)
+
+    def _entry(self, namespace: str, key: Hashable) -> Optional[_Entry]:
+        """The live entry for `key`, marked as recently used. Must be called with the lock held."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self._namespace_stats(namespace).expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, namespace: str, key: Hashable) -> Optional[tuple[Any, float]]:
+        """The cached value for `key` and the seconds it has left, if any."""
+        with self._lock:
+            stats = self._namespace_stats(namespace)
+            entry = self._entry(namespace, key)
+            if entry is None:
+                stats.misses += 1
+                return None
+            stats.hits += 1
+            return entry.value, entry.expires_at - time.monotonic()
+
+    def _over_budget(self) -> bool:
+        return self._bytes > self.max_bytes or (
+            self.max_entries is not None and len(self._entries) > self.max_entries
+        )
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: float) -> None:
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, namespace, size, time.monotonic() + ttl)
+            self._bytes += size
+            stats = self._namespace_stats(namespace)
+            stats.entries += 1
+            stats.bytes += size
+            # Evict least recently used entries until we are back under budget
+            while self._over_budget():
+                evicted = self._remove(next(iter(self._entries)))
+                self._namespace_stats(evicted.namespace).evictions += 1
+
+    async def get_or_fetch(
+        self,
+        namespace: str,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[T]],
+        ttl: float,
+    ) -> T:
+        """
+        Return the cached value for `key`, or call `fetch` to produce it.
+
+        If a fetch for the same key is already running, wait for its result
+        instead of starting another one. Exceptions are not cached.
+        """
+        with self._lock:
+            stats = self._namespace_stats(namespace)
+            hit, value = self._lookup(namespace, key)
+            if hit:
+                stats.hits += 1
+                return value
+            in_flight = self._in_flight.get(key)
+            owner = in_flight is None
+            if owner:
+                stats.misses += 1
+                in_flight = self._in_flight[key] = Future()
+            else:
+                stats.coalesced += 1
+        if not owner:
+            return await asyncio.wrap_future(in_flight)
+
+        # Run the fetch as its own task, so it completes for the other waiters
+        # even if this caller is cancelled
+        task = asyncio.ensure_future(fetch())
+
+        def publish(task: asyncio.Task) -> None:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            if task.cancelled():
+                in_flight.cancel()
+            elif task.exception() is not None:
+                in_flight.set_exception(task.exception())
+            else:
+                self.set(namespace, key, task.result(), ttl)
+                in_flight.set_result(task.result())
+
+        task.add_done_callback(publish)
+        return await asyncio.shield(task)
+
+    def invalidate(self, namespace: str, prefix: Optional[str] = None) -> int:
+        """
+        Drop every entry of a namespace, or only those whose (string) key
+        starts with `prefix`. Returns the number of entries dropped.
+        """
+        with self._lock:
+            keys = [
+                key
+                for key, entry in self._entries.items()
+                if entry.namespace == namespace
+                and (prefix is None or (isinstance(key, str) and key.startswith(prefix)))
+            ]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def delete(self, key: Hashable) -> bool:
+        """Drop one entry. Returns whether it was cached."""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            return True
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Hit, miss, eviction and size counters per namespace."""
+        with self._lock:
+            return {namespace: asdict(stats) for namespace, stats in self._stats.items()}
+
+
+feed_cache = FeedCache(
+    max_bytes=int(os.getenv("FEED_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    max_entries=int(os.getenv("FEED_CACHE_MAX_ENTRIES", 10000)),
+)
+
+
+class FeedCacheBackend(Backend):
+    """
+    A fastapi_cache backend keeping its entries in a FeedCache, under one
+    namespace, instead of fastapi_cache's unbounded InMemoryBackend.
+    """
+
+    def __init__(self, cache: FeedCache, namespace: str = "responses"):
+        self.cache = cache
+        self.namespace = namespace
+
+    async def get_with_ttl(self, key: str) -> tuple[int, Optional[bytes]]:
+        cached = self.cache.get(self.namespace, key)
+        if cached is None:
+            return 0, None
+        value, ttl = cached
+        # Redis answers -1 for keys without an expiry
+        return (-1 if ttl == float("inf") else int(ttl)), value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        cached = self.cache.get(self.namespace, key)
+        return None if cached is None else cached[0]
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        # Like Redis, entries without an expiry are kept until evicted
+        self.cache.set(self.namespace, key, value, expire or float("inf"))
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if namespace:
+            return self.cache.invalidate(self.namespace, prefix=namespace)
+        if key:
+            return int(self.cache.delete(key))
+        return 0
+
+
+def namespace_ttl(namespace: str, default: float) -> float:
+    """The TTL of a namespace, overridable with FEED_CACHE_TTL_<NAMESPACE>."""
+    env_name = "FEED_CACHE_TTL_" + namespace.upper().replace("-", "_")
+    return float(os.getenv(env_name, default))
+
+
+def cached(
+    namespace: str, ttl: float
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """
+    Cache the results of a coroutine function in the shared `feed_cache`.
+
+    Args:
+        namespace: Name of the source, used for stats and the TTL override.
+        ttl: Default number of seconds results are kept.
+    """
+    ttl = namespace_ttl(namespace, ttl)
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @wraps(func)
+        async def wrapper(*args, **kwargs) -> T:
+            key = (namespace, args, tuple(sorted(kwargs.items())))
+            return await feed_cache.get_or_fetch(
+                namespace, key, lambda: func(*args, **kwargs), ttl
+            )
+
+        wrapper.cache_clear = lambda: feed_cache.invalidate(namespace)  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
@@ -0,0 +1,144 @@
+"""
+Local catalog of every feed item the app has served, searchable across sources.
+
+Each source searches differently (WikiArt through its API, APOD through its own
+archive) and most can't be searched at all. Instead, every item fetched from an
+upstream is recorded here, keyed by (source, id), in SQLite with an FTS5 index
+over its title, artist, description and category. Searching the catalog is a
+local, ranked query over everything seen so far, from any source.
+
+Configuration (environment variables):
+  - CATALOG_PATH: location of the SQLite database (default data/catalog.sqlite3)
+"""
+
+import os
+import sqlite3
+import time
+from typing import ContextManager, Optional
+
+import db
+from schema import Feed, FeedItem
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", "data/catalog.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog (
+    source TEXT NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    artist_name TEXT,
+    description TEXT,
+    category TEXT,
+    item TEXT NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (source, id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5(
+    title, artist_name, description, category,
+    content='catalog', content_rowid='rowid', tokenize='porter unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS catalog_ai AFTER INSERT ON catalog BEGIN
+    INSERT INTO catalog_fts(rowid, title, artist_name, description, category)
+    VALUES (new.rowid, new.title, new.artist_name, new.description, new.category);
+END;
+CREATE TRIGGER IF NOT EXISTS catalog_ad AFTER DELETE ON catalog BEGIN
+    INSERT INTO catalog_fts(catalog_fts, rowid, title, artist_name, description, category)
+    VALUES ('delete', old.rowid, old.title, old.artist_name, old.description, old.category);
+END;
+CREATE TRIGGER IF NOT EXISTS catalog_au_indexed AFTER UPDATE ON catalog
+WHEN old.title IS NOT new.title
+    OR old.artist_name IS NOT new.artist_name
+    OR old.description IS NOT new.description
+    OR old.category IS NOT new.category
+BEGIN
+    INSERT INTO catalog_fts(catalog_fts, rowid, title, artist_name, description, category)
+    VALUES ('delete', old.rowid, old.title, old.artist_name, old.description, old.category);
+    INSERT INTO catalog_fts(rowid, title, artist_name, description, category)
+    VALUES (new.rowid, new.title, new.artist_name, new.description, new.category);
+END;
+"""
+
+
+def connect() -> ContextManager[sqlite3.Connection]:
+    """Open the catalog, creating the schema on first use."""
+    return db.connect(CATALOG_PATH, SCHEMA)
+
+
+def record_feed(source: str, feed: Feed) -> int:
+    """Insert or update the items of a fetched feed. Returns the number of items written."""
+    now = time.time()
+    rows = [
+        (
+            source,
+            item.id,
+            item.title,
+            item.artist_name,
+            item.description,
+            feed.category.name,
+            item.model_dump_json(),
+            now,
+        )
+        for item in feed.items
+        if item.id and item.image_url
+    ]
+    with connect() as connection:
+        # Only rows whose indexed columns changed are rewritten in the full-text
+        # index (see catalog_au_indexed), so refetching a feed doesn't churn it
+        connection.executemany(
+            """
+            INSERT INTO catalog
+                (source, id, title, artist_name, description, category, item, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(source, id) DO UPDATE SET
+                title = excluded.title,
+                artist_name = excluded.artist_name,
+                description = excluded.description,
+                category = excluded.category,
+                item = excluded.item,
+                last_seen = excluded.last_seen
+            """,
+            rows,
+        )
+    return len(rows)
+
+
+def search(
+    query: str, source: Optional[str] = None, limit: int = 100
+) -> list[tuple[str, FeedItem]]:
+    """
+    Search the catalog, best matches first.
+
+    Items matching every word of the query are returned if there are any.
+    Otherwise items matching any word, or the start of one, are, ranked so that
+    those matching more and rarer words come first. Title and artist matches
+    are weighted above matches in the description or category name.
+
+    Args:
+        query: Free text to search for.
+        source: Only return items of this media source.
+        limit: Maximum number of items to return.
+
+    Returns:
+        A list of (source, item) pairs.
+    """
+    if not db.fts_query(query):
+        return []
+    with connect() as connection:
+        rows = _match(connection, db.fts_query(query), source, limit)
+        if not rows:
+            rows = _match(connection, db.fts_query(query, any_word=True), source, limit)
+    return [(row["source"], FeedItem.model_validate_json(row["item"])) for row in rows]
+
+
+def _match(
+    connection: sqlite3.Connection, fts_query: str, source: Optional[str], limit: int
+) -> list[sqlite3.Row]:
+    return connection.execute(
+        """
+        SELECT c.source, c.item FROM catalog_fts JOIN catalog c ON c.rowid = catalog_fts.rowid
+        WHERE catalog_fts MATCH :query AND (:source IS NULL OR c.source = :source)
+        ORDER BY bm25(catalog_fts, 10.0, 5.0, 1.0, 2.0)
+        LIMIT :limit
+        """,
+        {"query": fts_query, "source": source, "limit": limit},
+    ).fetchall()
@@ -0,0 +1,54 @@
+"""
+SQLite helpers shared by the modules that keep local state: the APOD archive,
+the catalog, the agent cache, the artwork memo, the feed store and the image
+placeholders.
+
+Each of those modules owns its database file and schema and opens connections
+through `connect`, which runs the schema once per process and closes every
+connection when its block ends.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from typing import Iterator
+
+_ready: set[tuple[str, str]] = set()
+_ready_lock = threading.Lock()
+
+
+def _prepare(connection: sqlite3.Connection, path: str, schema: str) -> None:
+    """Switch the database to WAL and create its schema, once per process."""
+    with _ready_lock:
+        if (path, schema) in _ready:
+            return
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(schema)
+        _ready.add((path, schema))
+
+
+@contextmanager
+def connect(path: str, schema: str) -> Iterator[sqlite3.Connection]:
+    """
+    A connection to the database at `path`, committed when the block succeeds,
+    rolled back when it raises, and closed either way.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with closing(sqlite3.connect(path, timeout=30)) as connection:
+        connection.row_factory = sqlite3.Row
+        _prepare(connection, path, schema)
+        with connection:
+            yield connection
+
+
+def fts_query(query: str, any_word: bool = False) -> str:
+    """
+    Turn free text into an FTS5 query matching all of its words, in any order.
+    With `any_word`, it matches any word, or the start of one.
+    """
+    words = query.replace('"', " ").split()
+    if any_word:
+        return " OR ".join(f'"{word}"*' for word in words)
+    return " ".join(f'"{word}"' for word in words)
@@ -0,0 +1,86 @@
+"""
+On-disk feed store, the cache tier below the in-memory (or Redis) feed cache.
+
+The in-memory cache is lost on every restart and isn't shared between uvicorn
+workers, so without Redis each fresh worker would fetch every feed again. Feeds
+are therefore also written to a SQLite database, which every worker on the host
+reads from before going upstream.
+
+Each entry keeps the time it is fresh until and the time it expires (after the
+stale-while-revalidate window). Expired entries are never returned, and the
+least recently used entries are evicted once the store grows past its size budget.
+
+Configuration (environment variables):
+  - FEED_STORE_PATH: location of the SQLite database, empty to disable the store
+    (default data/feed_store.sqlite3)
+  - FEED_STORE_MAX_BYTES: size budget of the stored feeds (default 256 MiB)
+"""
+
+import os
+import sqlite3
+import time
+from typing import ContextManager, Optional
+
+import db
+
+FEED_STORE_PATH = os.getenv("FEED_STORE_PATH", "data/feed_store.sqlite3")
+FEED_STORE_MAX_BYTES = int(os.getenv("FEED_STORE_MAX_BYTES", 256 * 1024 * 1024))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS feeds_last_access ON feeds (last_access);
+"""
+
+
+def enabled() -> bool:
+    return bool(FEED_STORE_PATH)
+
+
+def connect() -> ContextManager[sqlite3.Connection]:
+    """Open the store, creating the schema on first use."""
+    return db.connect(FEED_STORE_PATH, SCHEMA)
+
+
+def get(key: str) -> Optional[tuple[bytes, float]]:
+    """The stored data for a key and the seconds until it expires, if it hasn't."""
+    now = time.time()
+    with connect() as connection:
+        row = connection.execute(
+            "SELECT data, expires_at FROM feeds WHERE key = ? AND expires_at > ?",
+            (key, now),
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE feeds SET last_access = ? WHERE key = ?", (now, key))
+    return row[0], row[1] - now
+
+
+def put(key: str, data: bytes, expire: float) -> None:
+    """Store data for `expire` seconds, evicting old entries to stay under budget."""
+    now = time.time()
+    with connect() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO feeds (key, data, size, expires_at, last_access)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, data, len(data), now + expire, now),
+        )
+        connection.execute("DELETE FROM feeds WHERE expires_at <= ?", (now,))
+        total = connection.execute("SELECT coalesce(sum(size), 0) FROM feeds").fetchone()[0]
+        if total <= FEED_STORE_MAX_BYTES:
+            return
+        # Evict least recently used entries until we are back under budget
+        evict = []
+        for evict_key, size in connection.execute(
+            "SELECT key, size FROM feeds ORDER BY last_access"
+        ):
+            if total <= FEED_STORE_MAX_BYTES:
+                break
+            evict.append((evict_key,))
+            total -= size
+        connection.executemany("DELETE FROM feeds WHERE key = ?", evict)
@@ -0,0 +1,349 @@
+"""
+Registry of the media sources' feed functions, and the shared path the feed
+endpoints use to fetch from them.
+
+Feeds are cached with stale-while-revalidate semantics: once a feed is older
+than its source's `expire` it is still served, immediately, while a background
+task fetches a fresh copy. Stale feeds are kept for up to FEED_MAX_STALE seconds
+past their expiry, during which upstream outages are answered from the cache
+instead of with errors. Below the size-bounded in-memory (or Redis) cache, feeds are also
+kept on disk by `feed_store`, so restarted and new workers don't start cold.
+
+Feeds are cached as the JSON the endpoints send, behind a one-line header with
+the time they are fresh until, so a cache hit is served as the stored bytes
+without being validated or encoded again.
+
+Configuration (environment variables):
+  - FEED_MAX_STALE: seconds a feed may be served after it expired (default 1 day)
+  - FEED_INCOMPLETE_EXPIRE: seconds a feed fetched while its source was missing
+    data is fresh for, e.g. an APOD search during the archive backfill (default 60)
+  - FEED_ACCESS_MAX: number of distinct feeds whose requests are counted for the
+    cache warmer before the counts decay (default 1000)
+"""
+
+import asyncio
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+import orjson
+from fastapi_cache import FastAPICache
+
+import catalog
+import feed_store
+import placeholders
+from apod import apod_archive_backfilled, get_apod_feed, search_apod
+from guardian_photos import get_guardian_photos_feed
+from reddit import get_reddit_feed
+from schema import Feed
+from singleflight import single_flight
+from thisiscolossal import get_thisiscolossal_feed
+from ukiyoe import get_ukiyo_e_pages
+from wikiart import get_wikiart_feed
+from workers import run_in_worker
+
+
+async def _fetch_apod(
+    category: str,
+    hd: bool,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> Feed:
+    if category.startswith("search:"):
+        return await search_apod(
+            category.replace("search:", ""),
+            hd,
+            start_date=start_date,
+            end_date=end_date,
+        )
+    return await get_apod_feed(year=category, hd=hd)
+
+
+async def _fetch_thisiscolossal(category: str, hd: bool) -> Feed:
+    return await get_thisiscolossal_feed(category)
+
+
+async def _fetch_guardian(category: str, hd: bool) -> Feed:
+    return await get_guardian_photos_feed(category.replace("__", "/"))
+
+
+async def _fetch_ukiyo_e(category: str, hd: bool, pages: Optional[int] = None) -> Feed:
+    return await get_ukiyo_e_pages(category, pages)
+
+
+def _apod_complete(category: str) -> bool:
+    # Searches only see the years of the archive backfilled so far
+    return not category.startswith("search:") or apod_archive_backfilled()
+
+
+@dataclass(frozen=True)
+class FeedSource:
+    fetch: Callable[..., Awaitable[Feed]]
+    # How long (in seconds) a fetched feed is considered fresh
+    expire: int
+    # Whether a feed of the category fetched now would be complete. Incomplete
+    # feeds are only fresh for FEED_INCOMPLETE_EXPIRE seconds.
+    complete: Callable[[str], bool] = lambda category: True
+
+    def expire_for(self, category: str) -> int:
+        """How long a feed of the category fetched now is fresh."""
+        return self.expire if self.complete(category) else FEED_INCOMPLETE_EXPIRE
+
+
+FEED_SOURCES: dict[str, FeedSource] = {
+    "apod": FeedSource(fetch=_fetch_apod, expire=600, complete=_apod_complete),
+    "thisiscolossal": FeedSource(fetch=_fetch_thisiscolossal, expire=600),
+    # Published galleries rarely change
+    "guardian": FeedSource(fetch=_fetch_guardian, expire=60 * 60 * 24),
+    "reddit": FeedSource(fetch=get_reddit_feed, expire=60 * 60 * 24),
+    "ukiyo-e": FeedSource(fetch=_fetch_ukiyo_e, expire=60 * 60 * 24),
+    # Short expiry so that the randomly seeded "most-viewed" feed is reshuffled regularly
+    "wikiart": FeedSource(fetch=get_wikiart_feed, expire=60 * 60),
+}
+
+
+def feed_key(source: str, category: str, hd: bool = False, **params) -> str:
+    """Identifies one feed, e.g. "reddit:analog:False"."""
+    extra = "".join(
+        f":{name}={value}" for name, value in sorted(params.items()) if value is not None
+    )
+    return f"{source}:{category}:{hd}{extra}"
+
+
+async def fetch_feed(source: str, category: str, hd: bool = False, **params) -> Feed:
+    """
+    Fetch a feed from its upstream source.
+
+    Concurrent calls for the same (source, category, hd) share a single upstream
+    fetch, across workers too when Redis is configured.
+    """
+    return await single_flight.do(
+        feed_key(source, category, hd, **params),
+        lambda: FEED_SOURCES[source].fetch(category, hd, **params),
+        model=Feed,
+    )
+
+
+FEED_MAX_STALE = int(os.getenv("FEED_MAX_STALE", 60 * 60 * 24))
+FEED_INCOMPLETE_EXPIRE = int(os.getenv("FEED_INCOMPLETE_EXPIRE", 60))
+FEED_ACCESS_MAX = int(os.getenv("FEED_ACCESS_MAX", 1000))
+
+# How often each (source, category) feed was requested recently, used to pick
+# hot categories for the cache warmer. Categories come from the request, so the
+# counts are kept to FEED_ACCESS_MAX feeds by `decay_feed_access`.
+feed_access: Counter[tuple[str, str]] = Counter()
+
+
+def decay_feed_access() -> None:
+    """Halve every request count, keeping only the most requested half of FEED_ACCESS_MAX feeds."""
+    kept = feed_access.most_common(FEED_ACCESS_MAX // 2)
+    feed_access.clear()
+    feed_access.update({feed: count // 2 for feed, count in kept if count > 1})
+
+
+def _count_access(source: str, category: str) -> None:
+    feed_access[(source, category)] += 1
+    if len(feed_access) > FEED_ACCESS_MAX:
+        decay_feed_access()
+
+
+# Keys being refreshed in the background, and the tasks doing it (kept referenced
+# so they aren't garbage collected mid-refresh)
+_refreshing: dict[str, asyncio.Task] = {}
+# Other background writes (catalog, disk store), kept referenced for the same reason
+_background_writes: set[asyncio.Task] = set()
+
+
+def _cache_key(key: str) -> str:
+    return f"{FastAPICache.get_prefix()}:feed:{key}"
+
+
+def _write_in_background(coro) -> None:
+    """Run a cache write without delaying the response."""
+    task = asyncio.create_task(coro)
+    _background_writes.add(task)
+    task.add_done_callback(_background_writes.discard)
+
+
+async def _read_from_store(key: str) -> Optional[bytes]:
+    """Read a feed from the disk store, copying it back into the memory cache."""
+    if not feed_store.enabled():
+        return None
+    stored = await run_in_worker(feed_store.get, _cache_key(key))
+    if stored is None:
+        return None
+    data, expires_in = stored
+    await FastAPICache.get_backend().set(_cache_key(key), data, expire=int(expires_in))
+    return data
+
+
+async def _store_on_disk(key: str, data: bytes, expire: int) -> None:
+    try:
+        await run_in_worker(feed_store.put, _cache_key(key), data, expire)
+    except Exception as e:
+        print(f"Failed to store feed {key} on disk: {e}")
+
+
+def _encode_entry(fresh_until: float, feed_json: bytes) -> bytes:
+    # Neither orjson nor pydantic emit raw newlines, so the first one ends the header
+    return orjson.dumps({"fresh_until": fresh_until}) + b"\n" + feed_json
+
+
+def _decode_entry(data: bytes) -> tuple[float, bytes]:
+    header, _, feed_json = data.partition(b"\n")
+    return orjson.loads(header)["fresh_until"], feed_json
+
+
+async def _read_cached(key: str) -> Optional[tuple[float, bytes]]:
+    """The cached feed JSON for `key` and the time until which it is fresh, if any."""
+    try:
+        data = await FastAPICache.get_backend().get(_cache_key(key))
+        if data is None:
+            # Another worker, or this one before a restart, may have fetched it
+            data = await _read_from_store(key)
+        if data is None:
+            return None
+        return _decode_entry(data)
+    except Exception as e:
+        print(f"Failed to read cached feed {key}: {e}")
+        return None
+
+
+async def _record_in_catalog(source: str, feed: Feed) -> None:
+    try:
+        await run_in_worker(catalog.record_feed, source, feed)
+    except Exception as e:
+        print(f"Failed to record {source} feed in the catalog: {e}")
+
+
+async def _refresh(source: str, category: str, hd: bool, **params) -> bytes:
+    """Fetch a feed from upstream, store it in the cache and return its JSON."""
+    key = feed_key(source, category, hd, **params)
+    # Checked before fetching, so data arriving during the fetch isn't assumed in it
+    expire = FEED_SOURCES[source].expire_for(category)
+    feed = await fetch_feed(source, category, hd, **params)
+    feed = await placeholders.apply_known(feed)
+    _write_in_background(_record_in_catalog(source, feed))
+    feed_json = feed.model_dump_json().encode()
+    await _store(key, feed_json, time.time() + expire)
+    return feed_json
+
+
+async def _store(key: str, feed_json: bytes, fresh_until: float) -> None:
+    """Cache a feed in memory and on disk, until its stale window is over."""
+    data = _encode_entry(fresh_until, feed_json)
+    expire = max(1, int(fresh_until - time.time())) + FEED_MAX_STALE
+    try:
+        await FastAPICache.get_backend().set(_cache_key(key), data, expire=expire)
+    except Exception as e:
+        print(f"Failed to cache feed {key}: {e}")
+    if feed_store.enabled():
+        _write_in_background(_store_on_disk(key, data, expire))
+
+
+async def _refresh_in_background(key: str, source: str, category: str, hd: bool, **params):
+    try:
+        await _refresh(source, category, hd, **params)
+    except Exception as e:
+        print(f"Background refresh of {key} failed, still serving the stale feed: {e}")
+
+
+def _schedule_refresh(key: str, source: str, category: str, hd: bool, **params) -> None:
+    if key in _refreshing:
+        return
+    task = asyncio.create_task(
+        _refresh_in_background(key, source, category, hd, **params)
+    )
+    _refreshing[key] = task
+    task.add_done_callback(lambda _: _refreshing.pop(key, None))
+
+
+async def get_feed_json(
+    source: str,
+    category: str,
+    hd: bool = False,
+    revalidate: bool = False,
+    count_access: bool = True,
+    **params,
+) -> bytes:
+    """
+    Return a feed's JSON from the cache, fetching it from upstream on a miss.
+
+    A stale feed is returned as is and refreshed in the background. With
+    `revalidate`, the feed is fetched from upstream even if cached, but a cached
+    copy is still returned if that fetch fails. Lookups that aren't user requests
+    (e.g. by the curator's agents) pass `count_access=False`, so the cache
+    warmer doesn't keep their feeds warm.
+    """
+    if count_access:
+        _count_access(source, category)
+    key = feed_key(source, category, hd, **params)
+    cached = await _read_cached(key)
+    if cached is None:
+        return await _refresh(source, category, hd, **params)
+    fresh_until, feed_json = cached
+    if revalidate:
+        try:
+            return await _refresh(source, category, hd, **params)
+        except Exception as e:
+            print(f"Refreshing {key} failed, serving the cached feed: {e}")
+            return feed_json
+    if time.time() >= fresh_until:
+        _schedule_refresh(key, source, category, hd, **params)
+    return feed_json
+
+
+async def get_cached_feed_json(
+    source: str, category: str, hd: bool = False, **params
+) -> Optional[bytes]:
+    """
+    Return a feed's JSON if it is cached, or None without fetching it.
+
+    Like `get_feed_json`, a stale feed is returned and refreshed in the background.
+    """
+    _count_access(source, category)
+    key = feed_key(source, category, hd, **params)
+    cached = await _read_cached(key)
+    if cached is None:
+        return None
+    fresh_until, feed_json = cached
+    if time.time() >= fresh_until:
+        _schedule_refresh(key, source, category, hd, **params)
+    return feed_json
+
+
+async def get_feed(
+    source: str,
+    category: str,
+    hd: bool = False,
+    revalidate: bool = False,
+    count_access: bool = True,
+    **params,
+) -> Feed:
+    """Like `get_feed_json`, for callers that need the Feed itself."""
+    return Feed.model_validate_json(
+        await get_feed_json(source, category, hd, revalidate, count_access, **params)
+    )
+
+
+async def warm_feed(source: str, category: str, within: float = 0) -> bool:
+    """
+    Fetch a feed into the cache if it is missing, or stale within `within` seconds.
+
+    Returns whether the feed was fetched.
+    """
+    cached = await _read_cached(feed_key(source, category))
+    if cached is not None and cached[0] > time.time() + within:
+        return False
+    await _refresh(source, category, False)
+    return True
+
+
+def feed_cache_control(source: str, category: str) -> str:
+    """Cache-Control header for a feed response of `source`."""
+    return (
+        f"public, max-age={FEED_SOURCES[source].expire_for(category)}, "
+        f"stale-while-revalidate={FEED_MAX_STALE}, stale-if-error={FEED_MAX_STALE}"
+    )
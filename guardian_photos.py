@@ -1,12 +1,17 @@
 from bs4 import BeautifulSoup
-import requests
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from http_client import get_async_client
 from schema import FeedItem, Category, Feed
-from functools import lru_cache
+from workers import run_in_worker
 from typing import Any, Optional
 from datetime import datetime
 import dateparser
 import warnings
 from bs4 import XMLParsedAsHTMLWarning
+import lxml.html
 
 warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
 
@@ -16,90 +21,237 @@ class GuardianCategory(Category):
         self.link = f"https://www.theguardian.com/{self.id}"
 
 
-def get_guardian_categories() -> list[GuardianCategory]:
-    rss_urls = [
-        "https://www.theguardian.com/news/series/ten-best-photographs-of-the-day/rss",
-        "https://www.theguardian.com/artanddesign/artanddesign+content/gallery/rss",
-    ]
+GUARDIAN_RSS_URLS = [
+    "https://www.theguardian.com/news/series/ten-best-photographs-of-the-day/rss",
+    "https://www.theguardian.com/artanddesign/artanddesign+content/gallery/rss",
+]
+
+# Categories older than this are served while being refreshed in the background
+GUARDIAN_CATEGORIES_TTL = float(os.getenv("GUARDIAN_CATEGORIES_TTL", 30 * 60))
+
+EXTRA_CATEGORIES = [
+    GuardianCategory(
+        id="artanddesign__gallery__2022__feb__17__ansel-adams-rare-photographs-in-stunning-hi-definition",
+        name="Ansel Adams: rare photographs in stunning hi-definition",
+        date=datetime(2022, 2, 17),
+    )
+]
+
+
+@dataclass
+class _RssFeedState:
+    """Validators and parsed categories from the last successful fetch of one RSS feed."""
+
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    categories: list[GuardianCategory] = field(default_factory=list)
+
+
+_rss_states = {url: _RssFeedState() for url in GUARDIAN_RSS_URLS}
+_categories: list[GuardianCategory] = []
+_categories_by_id: dict[str, GuardianCategory] = {}
+_fetched_at = 0.0
+_refresh_lock = asyncio.Lock()
+_background_refresh: Optional[asyncio.Task] = None
+
+
+def _parse_date(text: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return dateparser.parse(text)
+
+
+def _parse_rss(rss: str) -> list[GuardianCategory]:
+    soup = BeautifulSoup(rss, "lxml")
     categories = []
-    for url in rss_urls:
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, "lxml")
-        for item in soup.find_all("item"):
-            if (item.find("guid") is not None) and (
-                id := item.find("guid")
-                .text.strip()
-                .removeprefix("https://www.theguardian.com/")
-                .replace("/", "__")
-            ) not in [c.id for c in categories]:
-                date = dateparser.parse(item.find("dc:date").text.strip())
-                categories.append(
-                    GuardianCategory(
-                        id=id,
-                        name=item.find("title").text.strip(),
-                        date=date,
-                    )
-                )
-    # Sort categories by date
-    categories.sort(key=lambda x: x.date, reverse=True)
-    categories += [
-        GuardianCategory(
-            id="artanddesign__gallery__2022__feb__17__ansel-adams-rare-photographs-in-stunning-hi-definition",
-            name="Ansel Adams: rare photographs in stunning hi-definition",
-            date=datetime(2022, 2, 17),
+    for item in soup.find_all("item"):
+        if item.find("guid") is None:
+            continue
+        id = (
+            item.find("guid")
+            .text.strip()
+            .removeprefix("https://www.theguardian.com/")
+            .replace("/", "__")
+        )
+        categories.append(
+            GuardianCategory(
+                id=id,
+                name=item.find("title").text.strip(),
+                date=_parse_date(item.find("dc:date").text.strip()),
+            )
         )
-    ]
     return categories
 
 
-@lru_cache(maxsize=1024)
-def get_guardian_photos_feed(category: str) -> Feed:
+async def _fetch_rss(url: str) -> list[GuardianCategory]:
+    """Fetch one RSS feed with a conditional GET, reusing the last parse on 304."""
+    state = _rss_states[url]
+    headers = {}
+    if state.etag:
+        headers["If-None-Match"] = state.etag
+    if state.last_modified:
+        headers["If-Modified-Since"] = state.last_modified
+    response = await get_async_client().get(url, headers=headers)
+    if response.status_code == 304:
+        return state.categories
+    response.raise_for_status()
+    state.categories = await run_in_worker(_parse_rss, response.text)
+    state.etag = response.headers.get("ETag")
+    state.last_modified = response.headers.get("Last-Modified")
+    return state.categories
+
+
+async def _refresh_locked() -> list[GuardianCategory]:
+    global _categories, _categories_by_id, _fetched_at
+    feeds = await asyncio.gather(
+        *[_fetch_rss(url) for url in GUARDIAN_RSS_URLS], return_exceptions=True
+    )
+    if all(isinstance(feed, BaseException) for feed in feeds):
+        raise feeds[0]
+    categories_by_id: dict[str, GuardianCategory] = {}
+    for url, feed in zip(GUARDIAN_RSS_URLS, feeds):
+        if isinstance(feed, BaseException):
+            # Fall back to what this feed returned last time
+            print(f"Failed to fetch Guardian RSS feed {url}: {feed}")
+            feed = _rss_states[url].categories
+        for category in feed:
+            categories_by_id.setdefault(category.id, category)
+    # Sort categories by date
+    categories = sorted(
+        categories_by_id.values(), key=lambda x: x.date, reverse=True
+    ) + [category for category in EXTRA_CATEGORIES if category.id not in categories_by_id]
+    _categories = categories
+    _categories_by_id = {category.id: category for category in categories}
+    _fetched_at = time.monotonic()
+    return _categories
+
+
+async def refresh_guardian_categories() -> list[GuardianCategory]:
+    """Re-fetch the Guardian RSS feeds and rebuild the category list and index."""
+    async with _refresh_lock:
+        return await _refresh_locked()
+
+
+async def _refresh_in_background() -> None:
+    try:
+        await refresh_guardian_categories()
+    except Exception as e:
+        # Keep serving the stale categories
+        print(f"Failed to refresh Guardian categories: {e}")
+
+
+async def get_guardian_categories() -> list[GuardianCategory]:
+    """
+    Get the Guardian photo galleries, most recent first.
+
+    The list is cached for GUARDIAN_CATEGORIES_TTL seconds. After that the stale
+    list is returned immediately while it is refreshed in the background, using
+    conditional requests so unchanged feeds are not downloaded and parsed again.
+    """
+    global _background_refresh
+    if not _categories:
+        async with _refresh_lock:
+            # Another caller may have fetched the categories while we waited
+            if not _categories:
+                await _refresh_locked()
+            return _categories
+    if time.monotonic() - _fetched_at > GUARDIAN_CATEGORIES_TTL and (
+        _background_refresh is None or _background_refresh.done()
+    ):
+        _background_refresh = asyncio.create_task(_refresh_in_background())
+    return _categories
+
+
+async def get_guardian_category(category_id: str) -> Optional[GuardianCategory]:
+    """Look up a category by id (with "/" replaced by "__")."""
+    await get_guardian_categories()
+    return _categories_by_id.get(category_id)
+
+
+async def get_guardian_photos_feed(category: str) -> Feed:
     url = f"https://www.theguardian.com/{category}"
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, "html.parser")
-    # Get all the images
+    response = await get_async_client().get(url)
+    # An error page would parse as an empty gallery and replace the cached one
+    response.raise_for_status()
+    items = await run_in_worker(_parse_gallery, response.text)
+    guardian_category = await get_guardian_category(category.replace("/", "__"))
+    if guardian_category is not None:
+        category_name = guardian_category.name
+    else:
+        category_name = category.replace("__", " ").title()
+
+    return Feed(items=items, category=GuardianCategory(id=category, name=category_name))
+
+
+def _has_class(element, name: str) -> bool:
+    return name in (element.get("class") or "").split()
+
+
+def _text(element) -> str:
+    """
+    The text of an element, with whitespace-only runs that contain a newline
+    collapsed to a single newline, as BeautifulSoup does.
+    """
+    return "".join(
+        "\n" if "\n" in piece and not piece.strip() else piece
+        for piece in element.itertext()
+    )
+
+
+def _largest_source(image_container) -> str:
+    """The URL of the widest <source> of an image, or the <img> src if there are none."""
+    best_url, best_width = None, -1
+    for source in image_container.iter("source"):
+        url, width = source.get("srcset").split(" ")[:2]
+        width = int(width.removesuffix("w"))
+        # On equal widths, the later source wins, like a stable sort would pick
+        if width >= best_width:
+            best_url, best_width = url, width
+    if best_url is None:
+        return image_container.find(".//img").get("src")
+    return best_url
+
+
+def _parse_gallery(html: str) -> list[FeedItem]:
+    """
+    Extract the photos of a gallery page in a single pass over its <div>s, with
+    lxml (see tests/test_guardian_photos.py and benchmarks/parsers.py).
+    """
+    document = lxml.html.fromstring(html)
     images = []
     titles = []
     links = []
-    for image_container in soup.find_all("div", {"class":"gallery__img-container"}):
-        if image_container.find("div", class_="ad-slot-container") is not None:
-            continue
-        # Get the largest image
-        try:
-            images.append(sorted([img.get("srcset").split(" ") for img in image_container.find_all("source")], key=lambda x: int(x[1].removesuffix("w")))[-1][0])
-        except IndexError:
-            images.append(image_container.find("img").get("src"))
-        titles.append(image_container.find("img").get("alt"))
-        links.append(image_container.find("a").get("href"))
-    # Get all the captions
     captions = []
-    for caption in soup.find_all("div", {"class":"gallery__caption"}):
-        h2 = caption.find("h2").extract()
-        captions.append(f'<strong>{h2.text.strip()}</strong>: {caption.text.strip()}')
-
-    # Get all the photo credits
-    photo_credits = []
-    for photo_credit in soup.find_all("p", {"class":"gallery__credit"}):
-        photo_credits.append(photo_credit.text.strip())
-
-    items = []
-    # Put all the items together
-    for i in range(len(images)):
-        items.append(FeedItem(id=links[i].split("#")[-1], title=titles[i], description=captions[i], image_url=images[i], link=links[i]))
-    category_name = list(
-        filter(
-            lambda x: x.id == (category.replace("/", "__") if category else ""),
-            get_guardian_categories(),
-        )
-    )
-    if len(category_name) > 0:
-        category_name = category_name[0].name
-    else:
-        category_name = category.replace("__", " ").title()
+    # Listed up front, as captions are modified below
+    for div in list(document.iter("div")):
+        if _has_class(div, "gallery__img-container"):
+            if any(_has_class(d, "ad-slot-container") for d in div.iterdescendants("div")):
+                continue
+            images.append(_largest_source(div))
+            titles.append(div.find(".//img").get("alt"))
+            links.append(div.find(".//a").get("href"))
+        elif _has_class(div, "gallery__caption"):
+            h2 = div.find(".//h2")
+            heading = _text(h2).strip()
+            # Removes the heading but keeps the text that follows it
+            h2.drop_tree()
+            captions.append(f"<strong>{heading}</strong>: {_text(div).strip()}")
 
-    return Feed(items=items, category=GuardianCategory(id=category, name=category_name))
+    return [
+        FeedItem(
+            id=links[i].split("#")[-1],
+            title=titles[i],
+            description=captions[i],
+            image_url=images[i],
+            link=links[i],
+        )
+        for i in range(len(images))
+    ]
 
 
 if __name__ == "__main__":
-    items = get_guardian_photos_feed("news/gallery/2025/apr/25/black-grouse-courtship-and-first-pick-of-the-nfl-draft-photos-of-the-day-friday")
+    import asyncio
+
+    items = asyncio.run(get_guardian_photos_feed("news/gallery/2025/apr/25/black-grouse-courtship-and-first-pick-of-the-nfl-draft-photos-of-the-day-friday"))
     print(items)
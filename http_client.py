@@ -0,0 +1,158 @@
+"""
+Shared, pooled HTTP client used by every media source.
+
+The client is created once in the FastAPI lifespan hook (see `main.py`) so that
+connections to the handful of upstream hosts (apod.ellanan.com, wikiart.org,
+reddit.com, ...) are kept alive and reused, instead of paying a fresh TCP + TLS
+handshake on every cache miss. HTTP/2 is enabled so that concurrent requests to
+the same host are multiplexed over a single connection.
+
+Configuration (environment variables):
+  - HTTP_MAX_CONNECTIONS: total number of open connections in the pool (default 100)
+  - HTTP_MAX_KEEPALIVE_CONNECTIONS: idle connections kept alive (default 20)
+  - HTTP_KEEPALIVE_EXPIRY: seconds an idle connection is kept alive (default 30)
+  - HTTP_MAX_CONNECTIONS_PER_HOST: concurrent in-flight requests per host (default 10)
+  - HTTP_TIMEOUT: overall timeout in seconds (default 20)
+  - HTTP_CONNECT_TIMEOUT: connect timeout in seconds (default 5)
+  - HTTP_HTTP2: set to "false" to disable HTTP/2 (default "true")
+"""
+
+import asyncio
+import os
+from collections import defaultdict
+from typing import Optional
+
+import httpx
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=_env_int("HTTP_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=_env_int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20),
+        keepalive_expiry=_env_float("HTTP_KEEPALIVE_EXPIRY", 30),
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        _env_float("HTTP_TIMEOUT", 20), connect=_env_float("HTTP_CONNECT_TIMEOUT", 5)
+    )
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("HTTP_HTTP2", "true").lower() == "false":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """A response body that releases its host's request slot once it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, semaphore: asyncio.Semaphore):
+        self._stream = stream
+        self._semaphore = semaphore
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._semaphore.release()
+
+
+class HostLimitedAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps a transport and caps the number of in-flight requests per host.
+
+    A request holds its host's slot until its response is closed, so the cap
+    covers reading (or streaming) the body, not just waiting for the headers.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_per_host: int):
+        self._transport = transport
+        self._max_per_host = max_per_host
+        self._semaphores: dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self._max_per_host)
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        semaphore = self._semaphores[request.url.host]
+        await semaphore.acquire()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            semaphore.release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, semaphore),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def create_async_client() -> httpx.AsyncClient:
+    """Create a pooled, HTTP/2-enabled async client configured from the environment."""
+    transport = HostLimitedAsyncTransport(
+        httpx.AsyncHTTPTransport(http2=_http2_enabled(), limits=_limits(), retries=1),
+        max_per_host=_env_int("HTTP_MAX_CONNECTIONS_PER_HOST", 10),
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=_timeout(),
+        follow_redirects=True,
+    )
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Return the app-wide async client.
+
+    Outside of the FastAPI app (e.g. when running a source module as a script),
+    a client is created lazily on first use.
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = create_async_client()
+    return _async_client
+
+
+async def open_http_client() -> None:
+    """Create the shared client. Called from the FastAPI lifespan hook."""
+    global _async_client
+    _async_client = create_async_client()
+
+
+async def close_http_client() -> None:
+    """Close the shared client and release its pooled connections."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
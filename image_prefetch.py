@@ -0,0 +1,101 @@
+"""
+Server-side prefetching of the images a slideshow is about to show.
+
+When a feed is served, the upstream originals of its first few images are
+queued for download into the image proxy's disk cache. By the time the
+slideshow advances, the proxy serves (and resizes) them locally instead of
+waiting on a slow image host. This only helps when feed images go through the
+proxy, so prefetching follows IMAGE_PROXY_REWRITE unless set explicitly.
+
+The queue is bounded, and drops new work when full rather than falling behind.
+A few workers drain it, with at most IMAGE_PREFETCH_PER_HOST downloads from
+any one host at a time.
+
+Configuration (environment variables):
+  - IMAGE_PREFETCH: set to "true" or "false" to turn prefetching on or off
+    (default: on when IMAGE_PROXY_REWRITE is)
+  - IMAGE_PREFETCH_COUNT: images prefetched from the start of each served feed (default 5)
+  - IMAGE_PREFETCH_QUEUE: maximum number of queued images (default 200)
+  - IMAGE_PREFETCH_WORKERS: number of concurrent downloads (default 4)
+  - IMAGE_PREFETCH_PER_HOST: concurrent downloads per image host (default 2)
+"""
+
+import asyncio
+import os
+from collections import defaultdict
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+import image_proxy
+
+IMAGE_PREFETCH = (
+    os.getenv("IMAGE_PREFETCH", str(image_proxy.IMAGE_PROXY_REWRITE)).lower() == "true"
+)
+IMAGE_PREFETCH_COUNT = int(os.getenv("IMAGE_PREFETCH_COUNT", 5))
+IMAGE_PREFETCH_QUEUE = int(os.getenv("IMAGE_PREFETCH_QUEUE", 200))
+IMAGE_PREFETCH_WORKERS = int(os.getenv("IMAGE_PREFETCH_WORKERS", 4))
+IMAGE_PREFETCH_PER_HOST = int(os.getenv("IMAGE_PREFETCH_PER_HOST", 2))
+
+
+class ImagePrefetcher:
+    """A bounded queue of image URLs, downloaded into the image cache by a few workers."""
+
+    def __init__(self, max_queued: int, workers: int, per_host: int):
+        self.max_queued = max_queued
+        self.workers = workers
+        self.per_host = per_host
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: set[str] = set()
+        self._host_limits: dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.per_host)
+        )
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Start the workers. Called from the FastAPI lifespan hook."""
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._queued.clear()
+
+    def enqueue(self, url: str) -> bool:
+        """Queue an image for prefetching. Returns False if it was dropped."""
+        if self._queue is None or url in self._queued or not image_proxy.is_allowed(url):
+            return False
+        try:
+            self._queue.put_nowait(url)
+        except asyncio.QueueFull:
+            return False
+        self._queued.add(url)
+        return True
+
+    def prefetch_feed(self, feed: dict, count: int = IMAGE_PREFETCH_COUNT) -> int:
+        """Queue the first `count` images of a decoded feed, in slideshow order."""
+        return sum(self.enqueue(item["image_url"]) for item in feed["items"][:count])
+
+    async def _work(self) -> None:
+        while True:
+            url = await self._queue.get()
+            try:
+                async with self._host_limits[urlsplit(url).hostname]:
+                    await image_proxy.get_image(url, None, None)
+            except (image_proxy.ImageProxyError, httpx.HTTPError) as e:
+                print(f"Failed to prefetch image {url}: {e}")
+            except Exception as e:
+                print(f"Unexpected error prefetching image {url}: {e}")
+            finally:
+                self._queued.discard(url)
+                self._queue.task_done()
+
+
+image_prefetcher = ImagePrefetcher(
+    IMAGE_PREFETCH_QUEUE, IMAGE_PREFETCH_WORKERS, IMAGE_PREFETCH_PER_HOST
+)
@@ -0,0 +1,427 @@
+"""
+Image proxy that resizes and re-encodes upstream images, with a disk cache.
+
+Feed images come straight from upstream hosts (uploads.wikiart.org, i.redd.it,
+apod.nasa.gov, ...), and HD variants can be many megabytes. `/api/image` fetches
+them through the shared HTTP client. It can scale them down to a requested
+width and re-encode them as WebP or AVIF (format=auto picks WebP, or JPEG for
+clients without it). Transforms and cache file I/O run in the image worker
+pool, apart from feed parsing. Results are cached on disk with
+least-recently-used eviction, and served with long-lived cache headers and an
+ETag hashed from their content.
+
+Only images from known media hosts are proxied, and redirects are followed one
+hop at a time, each checked against the allowed hosts before it is requested. Requested widths are rounded up
+to a fixed set of sizes, so the cache isn't filled with one variant per pixel.
+Only raster images are proxied (see RASTER_TYPES), never SVG.
+
+Configuration (environment variables):
+  - IMAGE_CACHE_DIR: directory of the disk cache (default data/image_cache)
+  - IMAGE_CACHE_MAX_BYTES: size budget of the disk cache (default 1 GiB)
+  - IMAGE_PROXY_HOSTS: comma-separated host suffixes that may be proxied
+  - IMAGE_PROXY_MAX_BYTES: largest upstream image accepted (default 50 MiB)
+  - IMAGE_PROXY_QUALITY: WebP/AVIF/JPEG encoding quality (default 80)
+  - IMAGE_PROXY_REWRITE: set to "true" to point feed image_urls at the proxy
+  - IMAGE_PROXY_REWRITE_WIDTH: width requested by rewritten image_urls (default none)
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from urllib.parse import urlencode, urlsplit
+
+import httpx
+from PIL import Image, ImageOps
+
+from http_client import get_async_client
+from workers import run_in_image_worker
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "data/image_cache")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+IMAGE_PROXY_HOSTS = tuple(
+    host.strip().lower()
+    for host in os.getenv(
+        "IMAGE_PROXY_HOSTS",
+        "wikiart.org,redd.it,redditmedia.com,ukiyo-e.org,nasa.gov,guim.co.uk,thisiscolossal.com",
+    ).split(",")
+    if host.strip()
+)
+IMAGE_PROXY_MAX_BYTES = int(os.getenv("IMAGE_PROXY_MAX_BYTES", 50 * 1024 * 1024))
+IMAGE_PROXY_QUALITY = int(os.getenv("IMAGE_PROXY_QUALITY", 80))
+IMAGE_PROXY_REWRITE = os.getenv("IMAGE_PROXY_REWRITE", "false").lower() == "true"
+IMAGE_PROXY_REWRITE_WIDTH = os.getenv("IMAGE_PROXY_REWRITE_WIDTH")
+
+# Redirects followed when fetching an image, each hop checked against IMAGE_PROXY_HOSTS
+MAX_REDIRECTS = 5
+
+# Requested widths are rounded up to one of these
+WIDTHS = (160, 320, 480, 640, 800, 1024, 1280, 1600, 1920, 2560, 3840)
+
+FORMATS = {"webp": "image/webp", "avif": "image/avif", "jpeg": "image/jpeg"}
+
+# Upstream content types that are proxied. SVG is left out: it can carry
+# scripts, which would run on this origin when an original is opened directly
+RASTER_TYPES = frozenset(
+    {
+        "image/jpeg",
+        "image/jpg",
+        "image/pjpeg",
+        "image/png",
+        "image/gif",
+        "image/webp",
+        "image/avif",
+        "image/bmp",
+        "image/tiff",
+    }
+)
+
+# Transformed images never change for a given URL and parameters
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class ImageProxyError(Exception):
+    """The image can't be proxied. `status_code` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class CachedImage:
+    path: str
+    media_type: str
+    etag: str
+
+
+def is_allowed(url: str) -> bool:
+    """Whether `url` is an http(s) URL on one of the IMAGE_PROXY_HOSTS."""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    return parts.scheme in ("http", "https") and any(
+        host == allowed or host.endswith("." + allowed) for allowed in IMAGE_PROXY_HOSTS
+    )
+
+
+def snap_width(width: Optional[int]) -> Optional[int]:
+    """Round a requested width up to the nearest of WIDTHS."""
+    if width is None:
+        return None
+    return next((w for w in WIDTHS if w >= width), WIDTHS[-1])
+
+
+def negotiate_format(requested: str, accept: str) -> Optional[str]:
+    """
+    The output format for a request: a format name from FORMATS, or None to keep
+    the upstream encoding. "auto" picks WebP if the client accepts it, JPEG
+    otherwise. AVIF is smaller but many times slower to encode, so it is only
+    used when asked for explicitly.
+    """
+    if requested == "auto":
+        if "image/webp" in accept:
+            return "webp"
+        return "jpeg"
+    return None if requested == "original" else requested
+
+
+def proxied_url(url: str, width: Optional[int] = None, format: str = "auto") -> str:
+    """The /api/image URL serving `url`."""
+    params = {"url": url, "format": format}
+    if width:
+        params["w"] = width
+    return "/api/image?" + urlencode(params)
+
+
+def rewrite_feed_images(feed: dict) -> dict:
+    """Point the proxyable image_urls of a decoded feed at /api/image, in place."""
+    if not IMAGE_PROXY_REWRITE:
+        return feed
+    width = int(IMAGE_PROXY_REWRITE_WIDTH) if IMAGE_PROXY_REWRITE_WIDTH else None
+    for item in feed["items"]:
+        if is_allowed(item["image_url"]):
+            item["image_url"] = proxied_url(item["image_url"], width)
+    return feed
+
+
+class ImageCache:
+    """Files in a directory, evicted least recently used first once over budget."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._bytes: Optional[int] = None
+
+    def path(self, key: str, etag: str, media_type: str) -> str:
+        """Files are named "<key>.<etag>.<extension>", the ETag is a hash of the content."""
+        extension = media_type.split("/")[-1].split(";")[0] or "bin"
+        return os.path.join(self.directory, key[:2], f"{key}.{etag}.{extension}")
+
+    def temporary_path(self, key: str) -> str:
+        directory = os.path.join(self.directory, key[:2])
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{key}.{os.getpid()}.{time.monotonic_ns()}.tmp")
+
+    def _names(self, key: str) -> list[str]:
+        try:
+            names = os.listdir(os.path.join(self.directory, key[:2]))
+        except FileNotFoundError:
+            return []
+        return [
+            name
+            for name in names
+            if name.startswith(key + ".") and name.count(".") == 2 and not name.endswith(".tmp")
+        ]
+
+    def find(self, key: str) -> Optional[str]:
+        """The cached file for a key, marked as recently used, if any."""
+        names = self._names(key)
+        if not names:
+            return None
+        path = os.path.join(self.directory, key[:2], names[0])
+        # The modification time doubles as the last access time for eviction
+        os.utime(path)
+        return path
+
+    def _files(self) -> list[str]:
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".tmp"):
+                    files.append(os.path.join(root, name))
+        return files
+
+    def add(self, key: str, media_type: str, data: bytes) -> str:
+        temporary = self.temporary_path(key)
+        with open(temporary, "wb") as f:
+            f.write(data)
+        return self.commit(key, media_type, temporary, content_hash(data), len(data))
+
+    def commit(self, key: str, media_type: str, temporary: str, etag: str, size: int) -> str:
+        """Move a fully written temporary file into the cache under `key`."""
+        path = self.path(key, etag, media_type)
+        os.replace(temporary, path)
+        # Drop an older version of the same image whose content differed
+        for name in self._names(key):
+            if name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(self.directory, key[:2], name))
+                except FileNotFoundError:
+                    pass
+        self.added(size)
+        return path
+
+    def added(self, size: int) -> None:
+        """Account for a file added to the cache, evicting old files if over budget."""
+        if self._bytes is None:
+            self._bytes = sum(os.path.getsize(path) for path in self._files())
+        else:
+            self._bytes += size
+        if self._bytes <= self.max_bytes:
+            return
+        files = sorted(
+            ((os.stat(path), path) for path in self._files()),
+            key=lambda entry: entry[0].st_mtime,
+        )
+        # Other workers share the directory, so recount from the files themselves
+        self._bytes = sum(stat.st_size for stat, _ in files)
+        for stat, path in files:
+            if self._bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self._bytes -= stat.st_size
+            except FileNotFoundError:
+                pass
+
+
+image_cache = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES)
+
+_in_flight: dict[str, asyncio.Task] = {}
+
+
+def cache_key(url: str, width: Optional[int], format: Optional[str]) -> str:
+    return hashlib.sha256(f"{url}|{width}|{format}".encode()).hexdigest()
+
+
+def content_hash(data: bytes) -> str:
+    """The ETag of an image's bytes."""
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def _cached_image(path: str) -> CachedImage:
+    _, etag, extension = os.path.basename(path).split(".")
+    return CachedImage(path, "image/" + extension, etag)
+
+
+def transform(data: bytes, width: Optional[int], format: str) -> bytes:
+    """Scale an image down to `width` (never up) and encode it as `format`."""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if width is not None and image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        if format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA")
+        output = io.BytesIO()
+        image.save(output, format=format.upper(), quality=IMAGE_PROXY_QUALITY)
+        return output.getvalue()
+
+
+async def _open_upstream(url: str) -> tuple[httpx.Response, str]:
+    """
+    Send a streaming request for an upstream image, following redirects one hop
+    at a time so that no request is ever made to a host that isn't allowed.
+    Returns the open response and its content type; the caller must close it.
+    """
+    client = get_async_client()
+    request = client.build_request("GET", url)
+    for _ in range(MAX_REDIRECTS + 1):
+        response = await client.send(request, stream=True, follow_redirects=False)
+        if not response.is_redirect:
+            break
+        await response.aclose()
+        request = response.next_request
+        if request is None or not is_allowed(str(request.url)):
+            raise ImageProxyError("Redirected to a host that isn't allowed", 403)
+    else:
+        raise ImageProxyError("Too many redirects", 502)
+    if response.status_code != 200:
+        await response.aclose()
+        raise ImageProxyError(f"Upstream returned {response.status_code}", 502)
+    media_type = response.headers.get("content-type", "application/octet-stream")
+    if media_type.split(";")[0].strip().lower() not in RASTER_TYPES:
+        await response.aclose()
+        raise ImageProxyError(f"Upstream returned {media_type}, not a raster image", 502)
+    return response, media_type
+
+
+async def _download(url: str) -> tuple[bytes, str]:
+    """Fetch an upstream image, returning its bytes and content type."""
+    response, media_type = await _open_upstream(url)
+    try:
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if size > IMAGE_PROXY_MAX_BYTES:
+                raise ImageProxyError("Upstream image is too large", 413)
+            chunks.append(chunk)
+        return b"".join(chunks), media_type
+    finally:
+        await response.aclose()
+
+
+async def _produce(
+    url: str, width: Optional[int], format: Optional[str], key: str
+) -> CachedImage:
+    if format is None:
+        data, media_type = await _download(url)
+    else:
+        # Variants are made from the cached original, so that once the original
+        # is cached (e.g. by the prefetcher) no variant waits on the upstream
+        original = await get_image(url, None, None)
+        try:
+            data = await run_in_image_worker(_transform_file, original.path, width, format)
+        except Exception as e:
+            raise ImageProxyError(f"Could not transform the image: {e}", 502)
+        media_type = FORMATS[format]
+    path = await run_in_image_worker(image_cache.add, key, media_type, data)
+    return _cached_image(path)
+
+
+def _transform_file(path: str, width: Optional[int], format: str) -> bytes:
+    with open(path, "rb") as f:
+        return transform(f.read(), width, format)
+
+
+async def find_cached(
+    url: str, width: Optional[int], format: Optional[str]
+) -> Optional[CachedImage]:
+    """The proxied image if it is in the disk cache."""
+    if path := await run_in_image_worker(image_cache.find, cache_key(url, width, format)):
+        return _cached_image(path)
+    return None
+
+
+async def get_image(url: str, width: Optional[int], format: Optional[str]) -> CachedImage:
+    """
+    The proxied image, from the disk cache or fetched and transformed now. With
+    neither width nor format, this is the upstream original.
+    Concurrent requests for the same image share one fetch.
+    """
+    if not is_allowed(url):
+        raise ImageProxyError("Image host isn't allowed", 403)
+    if format is None and width is not None:
+        # Resizing needs a re-encode, keep the widely supported default
+        format = "webp"
+    if cached := await find_cached(url, width, format):
+        return cached
+
+    key = cache_key(url, width, format)
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_produce(url, width, format, key))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def stream_original(
+    url: str,
+) -> tuple[str, AsyncIterator[bytes], Callable[[], Awaitable[None]]]:
+    """
+    Stream an upstream image unchanged, storing a copy in the disk cache as it
+    passes through. Returns the content type, the body, and a function closing
+    the upstream response, which must be called once the response is sent: the
+    body isn't finalized if it is never iterated or the client disconnects.
+    """
+    if not is_allowed(url):
+        raise ImageProxyError("Image host isn't allowed", 403)
+    response, media_type = await _open_upstream(url)
+
+    async def body() -> AsyncIterator[bytes]:
+        key = cache_key(url, None, None)
+        digest = hashlib.sha256()
+        size = 0
+        temporary = None
+        f = None
+        try:
+            # File I/O runs in the image worker pool, off the event loop
+            temporary = await run_in_image_worker(image_cache.temporary_path, key)
+            f = await run_in_image_worker(open, temporary, "wb")
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size <= IMAGE_PROXY_MAX_BYTES:
+                    digest.update(chunk)
+                    await run_in_image_worker(f.write, chunk)
+                yield chunk
+            await run_in_image_worker(f.close)
+            if size <= IMAGE_PROXY_MAX_BYTES:
+                await run_in_image_worker(
+                    image_cache.commit,
+                    key,
+                    media_type,
+                    temporary,
+                    digest.hexdigest()[:32],
+                    size,
+                )
+        finally:
+            await response.aclose()
+            if temporary is not None:
+                await run_in_image_worker(_discard, f, temporary)
+
+    return media_type, body(), response.aclose
+
+
+def _discard(f, temporary: str) -> None:
+    """Close and remove a temporary file that wasn't committed to the cache."""
+    if f is not None:
+        f.close()
+    if os.path.exists(temporary):
+        os.remove(temporary)
@@ -14,14 +14,17 @@ Requires:
 
 import asyncio
 import os
-from typing import Optional
+from typing import AsyncIterator, Optional
 from pydantic_ai import Agent
 from pydantic import BaseModel, Field
 import dotenv
+import catalog
+from workers import run_in_worker
+from artwork_memo import recall_artwork, remember_artwork
+from agent_cache import cached_agent_output, get_cached, put_cached
 from models import get_all_categories, BijukaruUrlParams
-from wikiart import WikiArtCategory, search_wikiart_for_artists, get_wikiart_feed
-from ukiyoe import get_ukiyo_e_feed
-from reddit import get_reddit_feed
+from wikiart import WikiArtCategory, search_wikiart_for_artists
+from feeds import get_feed
 from apod import search_apod
 
 # Import Feed, FeedItem, Category from schema
@@ -166,12 +169,23 @@ agent = Agent(
         "If the user asks for a specific artist, try to point directly to 'artist:artist-name-slug' category instead of using the search_wikiart tool. If you cannot find the artist, use the `_search_wikiart_for_artists` tool to check whether the artist exists on WikiArt. If the artist is not found, don't return any categories."
         "Explain your reasoning for the category and image_id you chose."
         "Make sure the userfriendly_message is a user-friendly message to the user explaining the gallery parameters you chose, particularly the choice of category_id and image_id."
-        f"These are some of the categories for the media sources: {get_all_categories()}"
     ),
     instrument=True,  # Optional: Enable instrumentation for logging/debugging
 )
 
 
+@agent.system_prompt
+async def category_examples_prompt() -> str:
+    """
+    List the known categories in the system prompt.
+
+    Built on first use rather than at import, since fetching some categories
+    (e.g. the Guardian galleries) requires network access.
+    """
+    categories = await get_all_categories()
+    return f"These are some of the categories for the media sources: {categories}"
+
+
 # Register perform_research as a tool using the decorator
 @agent.tool_plain
 async def perform_research_tool(query: str) -> Optional[LLMResearchResult]:
@@ -249,13 +263,14 @@ async def _search_wikiart_for_artists(artists: list[str]) -> list[WikiArtCategor
     """
     Check whether the artists exist on WikiArt. If so, return the relevant categories. If not, return an empty list.
     """
-    return search_wikiart_for_artists(artists)
+    return await search_wikiart_for_artists(artists)
 
 
 async def get_structured_params(query: str) -> Optional[SuggestedBijukaruUrlParams]:
     """
     Uses pydantic-ai Agent with Gemini to parse a query into BijukaruUrlParams.
-    The agent can use the 'perform_research_tool' if needed.
+    The agent can use the 'perform_research_tool' if needed. Results are cached
+    by normalized query (see agent_cache).
 
     Args:
         query: The natural language query describing the desired gallery parameters.
@@ -263,7 +278,18 @@ async def get_structured_params(query: str) -> Optional[SuggestedBijukaruUrlPara
     Returns:
         A BijukaruUrlParams instance populated from the query, or None if an error occurs.
     """
+    return await cached_agent_output(
+        "search",
+        query,
+        FAST_MODEL,
+        SuggestedBijukaruUrlParams,
+        lambda: _run_structured_params_agent(query),
+    )
+
 
+async def _run_structured_params_agent(
+    query: str,
+) -> Optional[SuggestedBijukaruUrlParams]:
     print(f"Query: {query}")
 
     try:
@@ -390,6 +416,7 @@ Prioritize finding a valid source `link` (e.g., WikiArt artwork page, Reddit pos
    - For Japanese woodblock prints -> `get_ukiyo_e_feed_for_researcher(category='artist:<artist-slug>')` (if artist known) or try a relevant source category if mentioned.
    - For Reddit content -> `get_reddit_feed_for_researcher(subreddit=<subreddit_name>)` (You might need to infer the subreddit from the context).
    - For astronomy images -> `search_apod_for_researcher(query=<relevant keywords>)`
+   Before any of these, you may call `search_catalog_for_researcher(query='<title> <artist>')`, which instantly searches items already seen from every source.
 3. **Process Results:** From the results returned by the tool, select the BEST `FeedItem` match for the requested title/artist.
 4. **Fallback:** If the first attempt yields no good match, you MAY try *one* alternative search (e.g., a broader query with the same tool, or `get_wikiart_feed_for_researcher` as a general fallback).
 5. **Failure:** If you cannot find a reasonably certain match after 1-2 attempts, return a FeedItem with the original title/artist but null/empty link and image_url.
@@ -400,6 +427,33 @@ Do NOT invent details. Provide the found details in the `FeedItem` output format
 )
 
 
+@detail_researcher_agent.tool_plain
+async def search_catalog_for_researcher(
+    query: str, source: Optional[str] = None
+) -> Optional[Feed]:
+    """Searches the local catalog of every item already served, from all sources.
+    This is instant and doesn't hit any website, so try it first.
+    Args:
+        query: Words to search for (e.g., 'Starry Night van Gogh').
+        source: Optionally restrict to one source ('apod', 'thisiscolossal', 'guardian', 'reddit', 'ukiyo-e', 'wikiart').
+    Returns:
+        Feed object with the best matches, or None.
+    """
+    print(f"--- Detail Researcher Tool: Running catalog search for query: {query} ---")
+    try:
+        results = await run_in_worker(catalog.search, query, source, 20)
+    except Exception as e:
+        print(f"--- Detail Researcher Tool: Error in catalog search for '{query}': {e} ---")
+        return None
+    if not results:
+        print(f"--- Detail Researcher Tool: No catalog items found for '{query}' ---")
+        return None
+    return Feed(
+        items=[item for _, item in results],
+        category=Category(id=f"catalog:{query}", name=f"Search: {query}"),
+    )
+
+
 @detail_researcher_agent.tool_plain
 async def get_wikiart_feed_for_researcher(category: str) -> Optional[Feed]:
     """Fetches artwork data from WikiArt using a *specific category ID*.
@@ -414,9 +468,8 @@ async def get_wikiart_feed_for_researcher(category: str) -> Optional[Feed]:
         f"--- Detail Researcher Tool: Running get_wikiart_feed for category: {category} ---"
     )
     try:
-        loop = asyncio.get_running_loop()
-        # Call the original get_wikiart_feed function
-        feed = await loop.run_in_executor(None, get_wikiart_feed, category)
+        # Through the feed cache, which the WikiArt functions don't cache below
+        feed = await get_feed("wikiart", category, count_access=False)
         if feed and feed.items:
             print(
                 f"--- Detail Researcher Tool: Found {len(feed.items)} items for {category} ---"
@@ -427,7 +480,7 @@ async def get_wikiart_feed_for_researcher(category: str) -> Optional[Feed]:
                 print(
                     f"--- Detail Researcher Tool: Truncating feed items to {max_items} ---"
                 )
-                feed.items = feed.items[:max_items]
+                feed = feed.model_copy(update={"items": feed.items[:max_items]})
             return feed
         else:
             print(f"--- Detail Researcher Tool: No items found for {category} ---")
@@ -440,18 +493,22 @@ async def get_wikiart_feed_for_researcher(category: str) -> Optional[Feed]:
 
 
 @detail_researcher_agent.tool_plain
-async def search_apod_for_researcher(query: str) -> Optional[Feed]:
+async def search_apod_for_researcher(
+    query: str, start_date: Optional[str] = None, end_date: Optional[str] = None
+) -> Optional[Feed]:
     """Searches Astronomy Picture of the Day (APOD) for a specific query.
-    Use this to find details for astronomy-related images.
+    Use this to find details for astronomy-related images. Results are ranked by relevance.
     Args:
         query: The search term (e.g., 'nebula', 'galaxy', 'Crab Nebula').
+        start_date: Optional earliest date to include (YYYY-MM-DD).
+        end_date: Optional latest date to include (YYYY-MM-DD).
     Returns:
         Feed object with results, or None.
     """
     print(f"--- Detail Researcher Tool: Running search_apod for query: {query} ---")
     try:
-        # search_apod is already async
-        feed = await search_apod(query)
+        # search_apod queries the local APOD archive
+        feed = await search_apod(query, start_date=start_date, end_date=end_date)
         if feed and feed.items:
             print(
                 f"--- Detail Researcher Tool: Found {len(feed.items)} items for APOD query '{query}' ---"
@@ -462,7 +519,7 @@ async def search_apod_for_researcher(query: str) -> Optional[Feed]:
                 print(
                     f"--- Detail Researcher Tool: Truncating APOD items to {max_items} ---"
                 )
-                feed.items = feed.items[:max_items]
+                feed = feed.model_copy(update={"items": feed.items[:max_items]})
             return feed
         else:
             print(
@@ -489,9 +546,8 @@ async def get_ukiyo_e_feed_for_researcher(category: str) -> Optional[Feed]:
         f"--- Detail Researcher Tool: Running get_ukiyo_e_feed for category: {category} ---"
     )
     try:
-        # get_ukiyo_e_feed is synchronous
-        loop = asyncio.get_running_loop()
-        feed = await loop.run_in_executor(None, get_ukiyo_e_feed, category)
+        # Through the feed cache, shared with the app's requests for the category
+        feed = await get_feed("ukiyo-e", category, count_access=False)
         if feed and feed.items:
             print(
                 f"--- Detail Researcher Tool: Found {len(feed.items)} items for Ukiyo-e category '{category}' ---"
@@ -502,7 +558,7 @@ async def get_ukiyo_e_feed_for_researcher(category: str) -> Optional[Feed]:
                 print(
                     f"--- Detail Researcher Tool: Truncating Ukiyo-e items to {max_items} ---"
                 )
-                feed.items = feed.items[:max_items]
+                feed = feed.model_copy(update={"items": feed.items[:max_items]})
             return feed
         else:
             print(
@@ -529,9 +585,7 @@ async def get_reddit_feed_for_researcher(subreddit: str) -> Optional[Feed]:
         f"--- Detail Researcher Tool: Running get_reddit_feed for subreddit: {subreddit} ---"
     )
     try:
-        # get_reddit_feed is synchronous
-        loop = asyncio.get_running_loop()
-        feed = await loop.run_in_executor(None, get_reddit_feed, subreddit)
+        feed = await get_feed("reddit", subreddit, count_access=False)
         if feed and feed.items:
             print(
                 f"--- Detail Researcher Tool: Found {len(feed.items)} items for subreddit '{subreddit}' ---"
@@ -542,7 +596,7 @@ async def get_reddit_feed_for_researcher(subreddit: str) -> Optional[Feed]:
                 print(
                     f"--- Detail Researcher Tool: Truncating Reddit items to {max_items} ---"
                 )
-                feed.items = feed.items[:max_items]
+                feed = feed.model_copy(update={"items": feed.items[:max_items]})
             return feed
         else:
             print(
@@ -559,11 +613,142 @@ async def get_reddit_feed_for_researcher(subreddit: str) -> Optional[Feed]:
 # --- Orchestrating Function (Manager Logic) --- #
 
 
-async def generate_curated_feed_multi_agent(query: str) -> Optional[CuratedFeed]:
-    """Orchestrates the Curator and Researcher agents to generate a curated feed."""
-    print(f"--- Manager: Starting multi-agent process for query: {query} ---")
+# How many Detail Researcher agents run at once, and how long (in seconds) each
+# may take before its item is replaced with a placeholder
+CURATE_RESEARCH_CONCURRENCY = int(os.getenv("CURATE_RESEARCH_CONCURRENCY", 4))
+CURATE_RESEARCH_TIMEOUT = float(os.getenv("CURATE_RESEARCH_TIMEOUT", 60))
 
-    # 1. Call Story Curator
+
+PLACEHOLDER_ID_PREFIX = "placeholder-"
+
+
+def _placeholder_item(i: int, item_to_research: NarrativeItem) -> FeedItem:
+    """Stands in for an item the Detail Researcher couldn't find."""
+    return FeedItem(
+        id=f"{PLACEHOLDER_ID_PREFIX}{i+1}-{item_to_research.title.replace(' ', '-')[:20]}",
+        title=f"{item_to_research.title} (Details not found)",
+        artist_name=item_to_research.artist,
+        description=item_to_research.narrative_description,
+        image_url="",
+        link="",
+    )
+
+
+def _was_found(item: FeedItem) -> bool:
+    """
+    Whether the Detail Researcher found an item. When it can't, it returns the
+    requested title and artist with an empty link and image_url.
+    """
+    return bool(item.image_url and item.link)
+
+
+def _fully_researched(feed: CuratedFeed) -> bool:
+    """
+    Whether every item of a curated feed was found. Feeds with placeholders or
+    items the researcher couldn't find aren't cached, so the next request for
+    the query tries the missing items again. Placeholders have no link or
+    image_url either.
+    """
+    return all(_was_found(item) for item in feed.items)
+
+
+def _with_narrative(found_item: FeedItem, item_to_research: NarrativeItem) -> FeedItem:
+    """Combine researcher data with the curator's narrative description."""
+    found_item = found_item.model_copy(
+        update={"description": item_to_research.narrative_description}
+    )
+    # Ensure artist name is consistent if researcher found it
+    if not found_item.artist_name and item_to_research.artist:
+        found_item.artist_name = item_to_research.artist
+    return found_item
+
+
+async def research_narrative_item(
+    i: int, total: int, item_to_research: NarrativeItem
+) -> FeedItem:
+    """
+    Find the details of one item of the narrative plan, from the artwork memo if
+    it was researched before, otherwise with the Detail Researcher.
+    """
+    memoized = await recall_artwork(item_to_research.title, item_to_research.artist)
+    if memoized is not None:
+        print(
+            f"--- Manager: Found item {i+1}/{total} '{item_to_research.title}' in the artwork memo. ---"
+        )
+        return _with_narrative(memoized, item_to_research)
+
+    print(
+        f"--- Manager: Calling Detail Researcher Agent for item {i+1}/{total}: '{item_to_research.title}' ---"
+    )
+    research_request = ResearchRequest(
+        title=item_to_research.title, artist=item_to_research.artist
+    )
+    research_input = research_request.model_dump_json()  # Pass request as JSON string
+
+    # Add narrative context to researcher input? Might help disambiguate. Let's try adding it to the prompt implicitly via input string.
+    research_input_prompt = f"Find details for this artwork based on the request: {research_input}. Narrative context: {item_to_research.narrative_description}"
+
+    try:
+        detailed_item_result = await asyncio.wait_for(
+            detail_researcher_agent.run(research_input_prompt),
+            timeout=CURATE_RESEARCH_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        print(
+            f"--- Manager: Detail Researcher timed out for item {i+1}. Adding placeholder. ---"
+        )
+        return _placeholder_item(i, item_to_research)
+    except Exception as e:
+        print(
+            f"--- Manager: Detail Researcher errored for item {i+1}: {e}. Adding placeholder. ---"
+        )
+        return _placeholder_item(i, item_to_research)
+
+    if detailed_item_result and detailed_item_result.output:
+        found_item: FeedItem = detailed_item_result.output
+        # Failed lookups aren't memoized, so later stories try them again
+        if _was_found(found_item):
+            await remember_artwork(
+                item_to_research.title, item_to_research.artist, found_item
+            )
+        found_item = _with_narrative(found_item, item_to_research)
+        print(
+            f"--- Manager: Detail Researcher found details for item {i+1}. Link: {found_item.link} ---"
+        )
+        return found_item
+
+    print(
+        f"--- Manager: Detail Researcher failed for item {i+1}. Adding placeholder. ---"
+    )
+    # Add a placeholder item if researcher fails
+    return _placeholder_item(i, item_to_research)
+
+
+def _research_tasks(narrative_plan: NarrativePlan) -> list[asyncio.Task]:
+    """
+    Start researching every item of a narrative plan, at most
+    CURATE_RESEARCH_CONCURRENCY at a time. Each task returns (index, FeedItem).
+    """
+    semaphore = asyncio.Semaphore(CURATE_RESEARCH_CONCURRENCY)
+    total = len(narrative_plan.items)
+
+    async def research(i: int, item_to_research: NarrativeItem) -> tuple[int, FeedItem]:
+        async with semaphore:
+            return i, await research_narrative_item(i, total, item_to_research)
+
+    return [
+        asyncio.create_task(research(i, item))
+        for i, item in enumerate(narrative_plan.items)
+    ]
+
+
+async def research_narrative_items(narrative_plan: NarrativePlan) -> list[FeedItem]:
+    """Research every item of a narrative plan. Items are returned in the plan's order."""
+    return [item for _, item in await asyncio.gather(*_research_tasks(narrative_plan))]
+
+
+async def plan_narrative(query: str) -> Optional[NarrativePlan]:
+    """Ask the Story Curator for a narrative plan for the query."""
     print("--- Manager: Calling Story Curator Agent ---")
     narrative_plan_result = await story_curator_agent.run(query)
     if not narrative_plan_result or not narrative_plan_result.output:
@@ -574,59 +759,47 @@ async def generate_curated_feed_multi_agent(query: str) -> Optional[CuratedFeed]
     print(
         f"--- Manager: Story Curator returned plan for '{narrative_plan.suggested_category_name}' with {len(narrative_plan.items)} items. ---"
     )
+    return narrative_plan
 
-    # 2. Call Detail Researcher for each item
-    final_feed_items: list[FeedItem] = []
-    for i, item_to_research in enumerate(narrative_plan.items):
-        print(
-            f"--- Manager: Calling Detail Researcher Agent for item {i+1}/{len(narrative_plan.items)}: '{item_to_research.title}' ---"
-        )
-        research_request = ResearchRequest(
-            title=item_to_research.title, artist=item_to_research.artist
-        )
-        research_input = (
-            research_request.model_dump_json()
-        )  # Pass request as JSON string
-
-        # Add narrative context to researcher input? Might help disambiguate. Let's try adding it to the prompt implicitly via input string.
-        research_input_prompt = f"Find details for this artwork based on the request: {research_input}. Narrative context: {item_to_research.narrative_description}"
-
-        detailed_item_result = await detail_researcher_agent.run(research_input_prompt)
-
-        if detailed_item_result and detailed_item_result.output:
-            found_item: FeedItem = detailed_item_result.output
-            # Combine researcher data with curator's narrative description
-            found_item.description = item_to_research.narrative_description
-            # Ensure artist name is consistent if researcher found it
-            if not found_item.artist_name and item_to_research.artist:
-                found_item.artist_name = item_to_research.artist
-            final_feed_items.append(found_item)
-            print(
-                f"--- Manager: Detail Researcher found details for item {i+1}. Link: {found_item.link} ---"
-            )
-        else:
-            print(
-                f"--- Manager: Detail Researcher failed for item {i+1}. Adding placeholder. ---"
-            )
-            # Add a placeholder item if researcher fails
-            placeholder_item = FeedItem(
-                id=f"placeholder-{i+1}-{item_to_research.title.replace(' ', '-')[:20]}",
-                title=f"{item_to_research.title} (Details not found)",
-                artist_name=item_to_research.artist,
-                description=item_to_research.narrative_description,
-                image_url="",
-                link="",
-            )
-            final_feed_items.append(placeholder_item)
+
+def _curated_category(narrative_plan: NarrativePlan) -> Category:
+    return Category(
+        id=f"narrative:{narrative_plan.suggested_category_name.lower().replace(' ', '-')[:30]}",
+        name=narrative_plan.suggested_category_name,
+    )
+
+
+async def generate_curated_feed_multi_agent(query: str) -> Optional[CuratedFeed]:
+    """
+    Orchestrates the Curator and Researcher agents to generate a curated feed.
+    Fully researched results are cached by normalized query (see agent_cache).
+    """
+    return await cached_agent_output(
+        "curate",
+        query,
+        SMART_MODEL,
+        CuratedFeed,
+        lambda: _run_curation_agents(query),
+        cacheable=_fully_researched,
+    )
+
+
+async def _run_curation_agents(query: str) -> Optional[CuratedFeed]:
+    print(f"--- Manager: Starting multi-agent process for query: {query} ---")
+
+    # 1. Call Story Curator
+    narrative_plan = await plan_narrative(query)
+    if narrative_plan is None:
+        return None
+
+    # 2. Call Detail Researchers for all items concurrently, keeping the plan's order
+    final_feed_items: list[FeedItem] = await research_narrative_items(narrative_plan)
 
     # 3. Assemble Final Feed
     print("--- Manager: Assembling final CuratedFeed ---")
     final_feed = CuratedFeed(
         items=final_feed_items,
-        category=Category(
-            id=f"narrative:{narrative_plan.suggested_category_name.lower().replace(' ', '-')[:30]}",
-            name=narrative_plan.suggested_category_name,
-        ),
+        category=_curated_category(narrative_plan),
         llm_thinking=narrative_plan.curator_llm_thinking,  # Use curator's thinking
         userfriendly_message=narrative_plan.curator_userfriendly_message,  # Use curator's message
     )
@@ -635,6 +808,75 @@ async def generate_curated_feed_multi_agent(query: str) -> Optional[CuratedFeed]
     return final_feed
 
 
+async def stream_curated_feed(query: str) -> AsyncIterator[dict]:
+    """
+    Like generate_curated_feed_multi_agent, but yields the feed piece by piece:
+
+      - {"type": "plan", "category", "llm_thinking", "userfriendly_message", "total"}
+        as soon as the Story Curator is done,
+      - {"type": "item", "index", "item"} for each item as its research completes,
+        where `index` is the item's position in the plan,
+      - {"type": "done"} at the end, or {"type": "error", "error"} if no plan
+        could be made, including when the Story Curator fails.
+    """
+    cached_feed = await get_cached("curate", query, SMART_MODEL, CuratedFeed)
+    if cached_feed is not None:
+        yield {
+            "type": "plan",
+            "category": cached_feed.category.model_dump(),
+            "llm_thinking": cached_feed.llm_thinking,
+            "userfriendly_message": cached_feed.userfriendly_message,
+            "total": len(cached_feed.items),
+        }
+        for i, item in enumerate(cached_feed.items):
+            yield {"type": "item", "index": i, "item": item.model_dump()}
+        yield {"type": "done"}
+        return
+
+    print(f"--- Manager: Starting streaming multi-agent process for query: {query} ---")
+    # The response has started by now, so a failure has to be reported in the stream
+    try:
+        narrative_plan = await plan_narrative(query)
+    except Exception as e:
+        print(f"--- Manager: Story Curator errored: {e} ---")
+        narrative_plan = None
+    if narrative_plan is None:
+        yield {"type": "error", "error": "Could not generate curated feed for the query."}
+        return
+
+    category = _curated_category(narrative_plan)
+    yield {
+        "type": "plan",
+        "category": category.model_dump(),
+        "llm_thinking": narrative_plan.curator_llm_thinking,
+        "userfriendly_message": narrative_plan.curator_userfriendly_message,
+        "total": len(narrative_plan.items),
+    }
+    items: list[Optional[FeedItem]] = [None] * len(narrative_plan.items)
+    tasks = _research_tasks(narrative_plan)
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            i, item = await next_done
+            items[i] = item
+            yield {"type": "item", "index": i, "item": item.model_dump()}
+    finally:
+        # The client went away, stop researching items nobody will see
+        for task in tasks:
+            task.cancel()
+    yield {"type": "done"}
+
+    # Every item was researched, so /api/curate can reuse the feed, unless some
+    # weren't found
+    feed = CuratedFeed(
+        items=items,
+        category=category,
+        llm_thinking=narrative_plan.curator_llm_thinking,
+        userfriendly_message=narrative_plan.curator_userfriendly_message,
+    )
+    if _fully_researched(feed):
+        await put_cached("curate", query, SMART_MODEL, feed)
+
+
 # --- End Multi-Agent Architecture --- #
 
 # --- Main execution block --- #
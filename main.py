@@ -1,31 +1,56 @@
+import asyncio
 import random
+from contextlib import asynccontextmanager
 from urllib.parse import parse_qs, urlencode
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, RedirectResponse
+from fastapi import FastAPI, Query, Request, Response
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    ORJSONResponse,
+    FileResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
+from starlette.background import BackgroundTask, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
 from typing import List, Literal, Optional
 import hmac
+import httpx
 import os
+import orjson
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.inmemory import InMemoryBackend
 from fastapi_cache.decorator import cache
-from apod import get_apod_categories, get_apod_feed, search_apod
-from thisiscolossal import get_thisiscolossal_categories, get_thisiscolossal_feed
-from ukiyoe import get_ukiyo_e_feed, get_ukiyo_e_categories
-from guardian_photos import get_guardian_categories, get_guardian_photos_feed
-from reddit import get_reddit_feed, get_reddit_categories
-from wikiart import get_popular_artists, get_wikiart_feed, get_wikiart_categories
+from apod import get_apod_categories
+from thisiscolossal import get_thisiscolossal_categories
+from ukiyoe import iter_ukiyo_e_pages, get_ukiyo_e_categories
+from guardian_photos import get_guardian_categories
+from reddit import get_reddit_categories
+from wikiart import get_popular_artists, get_wikiart_categories
+from feeds import feed_cache_control, get_cached_feed_json, get_feed_json
+from singleflight import single_flight
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
+from workers import run_in_worker
+from http_client import open_http_client, close_http_client
+import agent_cache
+import catalog
+import image_proxy
+import placeholders
+from image_prefetch import IMAGE_PREFETCH, image_prefetcher
+from cache import FeedCacheBackend, feed_cache
+from orjson_coder import ORJSONCoder
+from warmer import WARMER_INTERVAL, configure_warmer, run_warmer
 
 # Import for structured search and curation
 from llm_research import (
     get_structured_params,
     generate_curated_feed_multi_agent,
+    stream_curated_feed,
     CuratedFeed,
 )
-from models import BijukaruUrlParams
+from models import BijukaruUrlParams, get_default_category, media_sources
+from quick_search import quick_search
 
 from schema import Category, Feed
 
@@ -36,12 +61,32 @@ if redis_url := os.getenv("REDIS_URL"):
     from fastapi_cache.backends.redis import RedisBackend
 
     redis = aioredis.from_url(redis_url)
-    FastAPICache.init(RedisBackend(redis), prefix="bijukaru")
+    FastAPICache.init(RedisBackend(redis), prefix="bijukaru", coder=ORJSONCoder)
+    # Coalesce upstream fetches across workers, not just within this one
+    single_flight.configure(redis)
+    # Warm the cache from one worker at a time
+    configure_warmer(redis)
 else:
-    FastAPICache.init(InMemoryBackend(), prefix="bijukaru")
+    # Bounded, unlike fastapi_cache's InMemoryBackend (see cache.FeedCacheBackend)
+    FastAPICache.init(FeedCacheBackend(feed_cache), prefix="bijukaru", coder=ORJSONCoder)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled HTTP client for all media sources, kept alive for the app's lifetime
+    await open_http_client()
+    # Keep the default and hot feeds cached, so visitors don't wait on upstreams
+    warmer = asyncio.create_task(run_warmer()) if WARMER_INTERVAL > 0 else None
+    if IMAGE_PREFETCH:
+        image_prefetcher.start()
+    yield
+    if warmer is not None:
+        warmer.cancel()
+    await image_prefetcher.stop()
+    await close_http_client()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Add CORS middleware if not already present
 app.add_middleware(
@@ -124,38 +169,33 @@ app.mount(
     "/_app", CacheControlStaticFiles(directory="static/spa/_app"), name="spa-assets"
 )
 
-media_sources = {
-    "apod": {
-        "media_source_name": "Astronomy Picture of the Day",
-        "media_source_url": "https://apod.nasa.gov/apod/astropix.html",
-        "media_hd": "true",
-    },
-    "thisiscolossal": {
-        "media_source_name": "This is Colossal",
-        "media_source_url": "https://www.thisiscolossal.com",
-        "media_hd": "false",
-    },
-    "guardian": {
-        "media_source_name": "Guardian Photos",
-        "media_source_url": "https://www.theguardian.com",
-        "media_hd": "false",
-    },
-    "reddit": {
-        "media_source_name": "Reddit",
-        "media_source_url": "https://www.reddit.com",
-        "media_hd": "true",
-    },
-    "ukiyo-e": {
-        "media_source_name": "Ukiyo-e",
-        "media_source_url": "https://ukiyo-e.org",
-        "media_hd": "false",
-    },
-    "wikiart": {
-        "media_source_name": "WikiArt",
-        "media_source_url": "https://www.wikiart.org",
-        "media_hd": "false",
-    },
-}
+
+async def serve_feed(
+    request: Request, source: str, category: str, hd: bool = False, **params
+) -> Response:
+    """
+    Serve a feed from the stale-while-revalidate cache, as the cached JSON bytes.
+    The feed is only decoded when its images are prefetched or rewritten.
+    """
+    feed_json = await get_feed_json(
+        source,
+        category,
+        hd,
+        # Like @cache, let clients force a fresh fetch
+        revalidate=request.headers.get("Cache-Control") == "no-cache",
+        **params,
+    )
+    if IMAGE_PREFETCH or image_proxy.IMAGE_PROXY_REWRITE:
+        feed = orjson.loads(feed_json)
+        # Get the first slides' images into the image cache before they are shown
+        image_prefetcher.prefetch_feed(feed)
+        if image_proxy.IMAGE_PROXY_REWRITE:
+            feed_json = orjson.dumps(image_proxy.rewrite_feed_images(feed))
+    return Response(
+        feed_json,
+        media_type="application/json",
+        headers={"Cache-Control": feed_cache_control(source, category)},
+    )
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -171,9 +211,8 @@ async def _get_thisiscolossal_categories():
 
 
 @app.get("/api/thisiscolossal/feed", response_model=Feed)
-@cache(expire=600)  # Cache for 10 minutes (600 seconds)
-async def _get_thisiscolossal_feed(category: Optional[str] = None):
-    return await get_thisiscolossal_feed(category)
+async def _get_thisiscolossal_feed(request: Request, category: str = "all-posts"):
+    return await serve_feed(request, "thisiscolossal", category)
 
 
 @app.get("/api/apod/categories", response_model=List[Category])
@@ -183,12 +222,21 @@ async def _get_apod_categories():
 
 
 @app.get("/api/apod/feed", response_model=Feed)
-@cache(expire=600)  # Cache for 10 minutes
-async def _get_apod_feed(category: str = "2025", hd: bool = False) -> Feed:
-    if category.startswith("search:"):
-        return await search_apod(category.replace("search:", ""), hd)
-    else:
-        return await get_apod_feed(year=category, hd=hd)
+async def _get_apod_feed(
+    request: Request,
+    category: str = "2025",
+    hd: bool = False,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+):
+    return await serve_feed(
+        request,
+        "apod",
+        category,
+        hd,
+        start_date=start_date,
+        end_date=end_date,
+    )
 
 
 @app.get("/api/ukiyo-e/categories", response_model=List[Category])
@@ -198,25 +246,58 @@ async def _get_ukiyo_e_categories():
 
 
 @app.get("/api/ukiyo-e/feed", response_model=Feed)
-@cache(expire=60 * 60 * 24)  # Cache for 1 day
-async def _get_ukiyo_e_feed(category: str = "met"):
-    # Get multiple pages of data
-    items = []
-    for start in [1, 100, 200, 300]:
-        feed = get_ukiyo_e_feed(category, start)
-        items.extend(feed.items)
-    return Feed(items=items, category=feed.category)
+async def _get_ukiyo_e_feed(
+    request: Request,
+    category: str = "met",
+    pages: Optional[int] = Query(None, ge=1, le=10),
+):
+    # Get multiple pages of data, fetched concurrently
+    return await serve_feed(request, "ukiyo-e", category, pages=pages)
+
+
+@app.get("/api/ukiyo-e/feed/stream")
+async def _stream_ukiyo_e_feed(
+    category: str = "met", pages: Optional[int] = Query(None, ge=1, le=10)
+):
+    """
+    Stream the feed as NDJSON, one line per page as soon as that page is parsed.
+    Pages arrive in completion order; each line carries its `start` offset.
+    A cached feed is sent whole, as a single line starting at 1. If no page
+    could be fetched, the last line is `{"error": ...}`.
+    """
+
+    async def page_lines():
+        cached = await get_cached_feed_json("ukiyo-e", category, pages=pages)
+        if cached is not None:
+            # The cached JSON is an object, so the offset is spliced in as its first field
+            yield b'{"start":1,' + cached[1:] + b"\n"
+            return
+        fetched = False
+        async for start, feed in iter_ukiyo_e_pages(category, pages):
+            fetched = True
+            yield orjson.dumps({"start": start, **feed.model_dump()}) + b"\n"
+        if not fetched:
+            error = f"Could not fetch the ukiyo-e feed for {category}"
+            yield orjson.dumps({"error": error}) + b"\n"
+
+    return StreamingResponse(page_lines(), media_type="application/x-ndjson")
+
 
 @app.get("/api/guardian/categories", response_model=List[Category])
 @cache(expire=3600)  # Cache for 1 hour
 async def _get_guardian_photos_categories():
-    return get_guardian_categories()
+    return await get_guardian_categories()
 
 
 @app.get("/api/guardian/feed", response_model=Feed)
-@cache(expire=60 * 60 * 24)  # Cache for 1 day
-async def _get_guardian_photos_feed(category: str = get_guardian_categories()[0].id):
-    return get_guardian_photos_feed(category.replace("__", "/"))
+async def _get_guardian_photos_feed(request: Request, category: Optional[str] = None):
+    if category is None:
+        try:
+            category = await get_default_category("guardian")
+        except LookupError as e:
+            return JSONResponse(content={"error": str(e)}, status_code=502)
+    return await serve_feed(request, "guardian", category)
+
 
 @app.get("/api/reddit/categories", response_model=List[Category])
 @cache(expire=3600)  # Cache for 1 hour
@@ -225,9 +306,14 @@ async def _get_reddit_categories():
 
 
 @app.get("/api/reddit/feed", response_model=Feed)
-@cache(expire=60 * 60 * 24)  # Cache for 1 day
-async def _get_reddit_feed(category: str = get_reddit_categories()[0].id, hd: bool = False):
-    return get_reddit_feed(category, hd)
+async def _get_reddit_feed(
+    request: Request,
+    category: Optional[str] = None,
+    hd: bool = False,
+):
+    if category is None:
+        category = await get_default_category("reddit")
+    return await serve_feed(request, "reddit", category, hd)
 
 
 @app.get("/api/wikiart/categories", response_model=List[Category])
@@ -236,28 +322,90 @@ async def _get_wikiart_categories():
     return get_wikiart_categories()
 
 
-@app.get("/api/wikiart/feed")
+@app.get("/api/wikiart/feed", response_model=Feed)
 async def _get_wikiart_feed(
-    request: Request, category: str = get_wikiart_categories()[0].id, hd: bool = False
+    request: Request,
+    category: Optional[str] = None,
+    hd: bool = False,
 ):
+    if category is None:
+        category = await get_default_category("wikiart")
     if category == "random-artist":
-        _category = "artist:" + random.choice(get_popular_artists())
+        _category = "artist:" + random.choice(await get_popular_artists())
         return RedirectResponse(
             f"{app.url_path_for('_get_wikiart_feed')}/?category={_category}&hd={hd}"
         )
-    else:
-        _category = category
-    # Send cache control headers
-    content = get_wikiart_feed(_category, hd)
-    response = JSONResponse(
-        content=content.model_dump(),
-        headers={
-            "Cache-Control": (
-                "public, max-age=3600" if category != "random-artist" else "no-cache"
-            )
-        },
+    return await serve_feed(request, "wikiart", category, hd)
+
+
+@app.get("/api/catalog/search", response_model=Feed)
+async def search_catalog(
+    query: str,
+    source: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+):
+    """
+    Search every item served so far, across all sources, best matches first.
+    Runs against the local catalog, so it never waits on an upstream.
+    """
+    results = await run_in_worker(catalog.search, query, source, limit)
+    return Feed(
+        items=[item for _, item in results],
+        category=Category(id=f"catalog:{query}", name=f"Search: {query}"),
+    )
+
+
+@app.get("/api/image")
+async def proxy_image(
+    request: Request,
+    url: str,
+    w: Optional[int] = Query(None, ge=16, le=4096),
+    format: Literal["auto", "webp", "avif", "jpeg", "original"] = "auto",
+):
+    """
+    Serve an upstream feed image, optionally scaled down to width `w` and
+    re-encoded. format=auto picks WebP, or JPEG if the Accept header lacks it.
+    """
+    width = image_proxy.snap_width(w)
+    output_format = image_proxy.negotiate_format(format, request.headers.get("accept", ""))
+    headers = {"Cache-Control": image_proxy.CACHE_CONTROL, "X-Content-Type-Options": "nosniff"}
+    if format == "auto":
+        headers["Vary"] = "Accept"
+    # Once the response is sent, the original is in the disk cache to measure
+    measure = (
+        BackgroundTask(placeholders.measure_served, url) if placeholders.PLACEHOLDERS else None
+    )
+    try:
+        if output_format is None and width is None:
+            image = await image_proxy.find_cached(url, None, None)
+            if image is None:
+                # Nothing to transform, pass the upstream response straight through
+                media_type, body, close = await image_proxy.stream_original(url)
+                # Runs even if the client disconnects before the body is sent
+                background = BackgroundTasks([BackgroundTask(close)])
+                if measure is not None:
+                    background.add_task(measure.func, *measure.args)
+                return StreamingResponse(
+                    body, media_type=media_type, headers=headers, background=background
+                )
+        else:
+            image = await image_proxy.get_image(url, width, output_format)
+    except image_proxy.ImageProxyError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=e.status_code)
+    except httpx.HTTPError as e:
+        return JSONResponse(
+            content={"error": f"Could not fetch the image: {e}"}, status_code=502
+        )
+
+    etag = f'"{image.etag}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+    return FileResponse(
+        image.path,
+        media_type=image.media_type,
+        headers={**headers, "ETag": etag},
+        background=measure,
     )
-    return response
 
 
 @app.get("/api/verify_token")
@@ -305,6 +453,11 @@ async def search_gallery(query: str, token: Optional[str] = None) -> JSONRespons
             status_code=401,
         )
 
+    # Simple queries ("hokusai", "apod 2019", "r/analog") don't need the LLM
+    if quick_result := await quick_search(query):
+        params, message = quick_result
+        return JSONResponse(content={"url": params.url, "userfriendly_message": message})
+
     structured_params: Optional[BijukaruUrlParams] = await get_structured_params(query)
     if structured_params and structured_params.url:
         return JSONResponse(
@@ -345,7 +498,7 @@ async def curate_gallery(query: str, token: Optional[str] = None) -> JSONRespons
     curated_feed: Optional[CuratedFeed] = await generate_curated_feed_multi_agent(query)
     if curated_feed:
         # Add cache control headers
-        response = JSONResponse(
+        response = ORJSONResponse(
             content=curated_feed.model_dump(),
             headers={"Cache-Control": "public, max-age=3600"},  # Cache for 1 hour
         )
@@ -357,6 +510,33 @@ async def curate_gallery(query: str, token: Optional[str] = None) -> JSONRespons
         )
 
 
+@app.get("/api/curate/stream")
+async def stream_curate_gallery(query: str, token: Optional[str] = None):
+    """
+    Streaming variant of /api/curate, as NDJSON: first the narrative plan, then
+    each researched item as soon as it is ready (in completion order, with its
+    `index` in the plan), then a final "done" line.
+    Requires a valid token for access.
+    """
+    search_token = os.getenv("SEARCH_TOKEN")
+    if search_token is None:
+        return JSONResponse(
+            content={"error": "Server configuration error"}, status_code=500
+        )
+
+    if not token or not hmac.compare_digest(token, search_token):
+        return JSONResponse(
+            content={"error": "Unauthorized. Valid token required for curation."},
+            status_code=401,
+        )
+
+    async def event_lines():
+        async for event in stream_curated_feed(query):
+            yield orjson.dumps(event) + b"\n"
+
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
+
+
 @app.get("/api/media_sources")
 @cache(expire=3600)
 async def get_media_sources():
@@ -374,6 +554,18 @@ async def get_media_sources():
     return sources
 
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Hit, miss and eviction counters of the source-level feed cache."""
+    return feed_cache.stats()
+
+
+@app.get("/api/cache/agent_stats")
+async def get_agent_cache_stats():
+    """Hit rate of the persistent cache of search and curation agent outputs."""
+    return await run_in_worker(agent_cache.stats)
+
+
 # This must be last to avoid capturing API routes
 @app.get("/{path}", response_class=HTMLResponse)
 async def serve_spa(
@@ -1,3 +1,5 @@
+import inspect
+import time
 from typing import Optional, Literal, Dict, List, ClassVar, get_args, Any
 
 from pydantic import BaseModel, Field
@@ -15,6 +17,39 @@ MEDIA_SOURCE_LITERAL = Literal[
     "apod", "thisiscolossal", "guardian", "reddit", "ukiyo-e", "wikiart"
 ]
 
+media_sources = {
+    "apod": {
+        "media_source_name": "Astronomy Picture of the Day",
+        "media_source_url": "https://apod.nasa.gov/apod/astropix.html",
+        "media_hd": "true",
+    },
+    "thisiscolossal": {
+        "media_source_name": "This is Colossal",
+        "media_source_url": "https://www.thisiscolossal.com",
+        "media_hd": "false",
+    },
+    "guardian": {
+        "media_source_name": "Guardian Photos",
+        "media_source_url": "https://www.theguardian.com",
+        "media_hd": "false",
+    },
+    "reddit": {
+        "media_source_name": "Reddit",
+        "media_source_url": "https://www.reddit.com",
+        "media_hd": "true",
+    },
+    "ukiyo-e": {
+        "media_source_name": "Ukiyo-e",
+        "media_source_url": "https://ukiyo-e.org",
+        "media_hd": "false",
+    },
+    "wikiart": {
+        "media_source_name": "WikiArt",
+        "media_source_url": "https://www.wikiart.org",
+        "media_hd": "false",
+    },
+}
+
 
 class BijukaruUrlParams(BaseModel):
     """Represents the parameters for generating or parsing a Bijukaru gallery URL. This model defines the structure for specifying the media source, content filtering, and display options for the gallery."""
@@ -99,17 +134,33 @@ CATEGORY_FETCHERS: Dict[MEDIA_SOURCE_LITERAL, Any] = {  # Use Any for value type
 }
 
 
-def get_all_categories() -> (
+# How long get_all_categories() results are reused before fetching again, and
+# how long when some source failed to fetch
+ALL_CATEGORIES_TTL = 60 * 60
+ALL_CATEGORIES_PARTIAL_TTL = 60
+# (expiry time, categories)
+_all_categories_cache: Optional[tuple[float, Dict[MEDIA_SOURCE_LITERAL, List[dict]]]] = None
+
+
+async def get_all_categories() -> (
     Dict[MEDIA_SOURCE_LITERAL, List[dict]]
 ):  # Use alias for key type
     """
     Fetches categories for all defined media sources by calling their respective
     category-fetching functions.
 
+    Results are cached for ALL_CATEGORIES_TTL seconds, or ALL_CATEGORIES_PARTIAL_TTL
+    seconds if a source failed to fetch, so an upstream outage doesn't make every
+    call wait on it again.
+
     Returns:
         A dictionary mapping each media source ID (as a string) to its list of Category objects.
         Returns an empty list for a source if fetching fails.
     """
+    global _all_categories_cache
+    if _all_categories_cache is not None and time.monotonic() < _all_categories_cache[0]:
+        return _all_categories_cache[1]
+
     all_categories: Dict[MEDIA_SOURCE_LITERAL, List[dict]] = {}
     # Get the literal values using get_args on the alias
     media_sources = get_args(MEDIA_SOURCE_LITERAL)
@@ -118,8 +169,10 @@ def get_all_categories() -> (
         try:
             fetcher = CATEGORY_FETCHERS.get(source)
             if fetcher:
-                # Call the synchronous category function
                 categories = fetcher()
+                # Some category functions (e.g. the Guardian's) are async
+                if inspect.isawaitable(categories):
+                    categories = await categories
                 all_categories[source] = [
                     {"id": cat.id, "name": cat.name} for cat in categories
                 ]
@@ -132,14 +185,62 @@ def get_all_categories() -> (
             print(f"Error fetching categories for {source}: {e}")
             all_categories[source] = []  # Return empty list on error
 
+    ttl = ALL_CATEGORIES_TTL if all(all_categories.values()) else ALL_CATEGORIES_PARTIAL_TTL
+    _all_categories_cache = (time.monotonic() + ttl, all_categories)
     return all_categories
 
 
+_default_categories: Dict[MEDIA_SOURCE_LITERAL, tuple[float, str]] = {}
+
+# Used when a source's categories can't be fetched and none were fetched before.
+# The Guardian's galleries change daily, so it has none.
+STATIC_DEFAULT_CATEGORIES: Dict[MEDIA_SOURCE_LITERAL, str] = {
+    "apod": "2025",
+    "thisiscolossal": "all-posts",
+    "reddit": "analog",
+    "ukiyo-e": "met",
+    "wikiart": "most-viewed",
+}
+
+
+async def get_default_category(media_source: MEDIA_SOURCE_LITERAL) -> str:
+    """
+    The id of the first category of a media source, used when none is requested.
+
+    Resolved on first use and cached for ALL_CATEGORIES_TTL seconds. If the
+    categories can't be fetched, the last resolved id is used even if expired,
+    or else the source's STATIC_DEFAULT_CATEGORIES entry.
+
+    Raises:
+        LookupError: If there is no category to fall back on either.
+    """
+    cached = _default_categories.get(media_source)
+    if cached is not None and time.monotonic() - cached[0] < ALL_CATEGORIES_TTL:
+        return cached[1]
+    try:
+        categories = CATEGORY_FETCHERS[media_source]()
+        if inspect.isawaitable(categories):
+            categories = await categories
+    except Exception as e:
+        print(f"Error fetching categories for {media_source}: {e}")
+        categories = []
+    if not categories:
+        if cached is not None:
+            return cached[1]
+        if media_source in STATIC_DEFAULT_CATEGORIES:
+            return STATIC_DEFAULT_CATEGORIES[media_source]
+        raise LookupError(f"No {media_source} categories are available")
+    category_id = categories[0].id
+    _default_categories[media_source] = (time.monotonic(), category_id)
+    return category_id
+
+
 # Example of how to use it (can be run directly if needed)
 if __name__ == "__main__":
+    import asyncio
     import json
 
-    categories_dict = get_all_categories()
+    categories_dict = asyncio.run(get_all_categories())
     # Convert Category objects to dicts for JSON serialization
     serializable_dict = {
         source: [cat.model_dump() for cat in cats]
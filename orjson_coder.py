@@ -0,0 +1,30 @@
+"""
+fastapi_cache coder that stores response bodies as orjson-encoded bytes.
+
+The default JsonCoder encodes through `json` with a custom encoder and decodes
+with an object hook, both in pure Python. ORJSONCoder does both with orjson.
+
+Cache hits are still decoded rather than returned as the stored bytes: FastAPI
+drops the headers @cache sets on a hit (Cache-Control, ETag) when an endpoint
+returns a Response. The feed endpoints, which carry most of the traffic, are
+cached by `feeds` instead and do serve the stored bytes as they are.
+"""
+
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from fastapi_cache.coder import Coder
+
+
+class ORJSONCoder(Coder):
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        if isinstance(value, Response):
+            return value.body
+        return orjson.dumps(jsonable_encoder(value))
+
+    @classmethod
+    def decode(cls, value: bytes) -> Any:
+        return orjson.loads(value)
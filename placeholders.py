@@ -0,0 +1,159 @@
+"""
+Image dimensions and low-quality placeholders for feed items.
+
+The frontend can reserve an image's layout and show a blurred preview while it
+loads, if it knows the image's size and has a tiny version of it. Sources that
+report dimensions (WikiArt, Reddit) fill `width`/`height` themselves. For the
+rest, and for every placeholder, images are measured after `/api/image` has
+served them, from the original in the proxy's disk cache, so measuring never
+downloads anything of its own. Results are stored in SQLite by image URL, and
+feeds pick them up the next time they are fetched from upstream.
+
+Placeholders are a PLACEHOLDER_SIZE pixel WebP thumbnail, as a base64 data: URI
+of a few hundred bytes.
+
+Configuration (environment variables):
+  - PLACEHOLDERS: set to "true" to measure images and add placeholders to feeds
+  - PLACEHOLDER_PATH: location of the SQLite database (default data/placeholders.sqlite3)
+  - PLACEHOLDER_SIZE: largest side of a placeholder in pixels (default 16)
+  - PLACEHOLDER_CONCURRENCY: images measured at once (default 4)
+"""
+
+import asyncio
+import base64
+import io
+import os
+import sqlite3
+from typing import ContextManager, Optional
+
+from PIL import Image, ImageOps
+
+import db
+import image_proxy
+from schema import Feed, FeedItem
+from workers import run_in_image_worker, run_in_worker
+
+PLACEHOLDERS = os.getenv("PLACEHOLDERS", "false").lower() == "true"
+PLACEHOLDER_PATH = os.getenv("PLACEHOLDER_PATH", "data/placeholders.sqlite3")
+PLACEHOLDER_SIZE = int(os.getenv("PLACEHOLDER_SIZE", 16))
+PLACEHOLDER_CONCURRENCY = int(os.getenv("PLACEHOLDER_CONCURRENCY", 4))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS placeholders (
+    url TEXT PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    placeholder TEXT NOT NULL
+);
+"""
+
+_semaphore: Optional[asyncio.Semaphore] = None
+# Image URLs being measured, so concurrent requests for one image measure it once
+_measuring: set[str] = set()
+
+
+def connect() -> ContextManager[sqlite3.Connection]:
+    """Open the database, creating the schema on first use."""
+    return db.connect(PLACEHOLDER_PATH, SCHEMA)
+
+
+def lookup(urls: list[str]) -> dict[str, tuple[int, int, str]]:
+    """The stored (width, height, placeholder) of each known URL."""
+    known = {}
+    with connect() as connection:
+        # Stay under SQLite's limit on the number of query parameters
+        for start in range(0, len(urls), 500):
+            batch = urls[start : start + 500]
+            rows = connection.execute(
+                "SELECT url, width, height, placeholder FROM placeholders"
+                f" WHERE url IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+            for url, width, height, placeholder in rows:
+                known[url] = (width, height, placeholder)
+    return known
+
+
+def store(url: str, width: int, height: int, placeholder: str) -> None:
+    with connect() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO placeholders (url, width, height, placeholder)"
+            " VALUES (?, ?, ?, ?)",
+            (url, width, height, placeholder),
+        )
+
+
+def measure(path: str) -> tuple[int, int, str]:
+    """The width, height and placeholder data: URI of an image file."""
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        width, height = image.size
+        image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        output = io.BytesIO()
+        image.save(output, format="WEBP", quality=50)
+    encoded = base64.b64encode(output.getvalue()).decode()
+    return width, height, f"data:image/webp;base64,{encoded}"
+
+
+def _with_known(item: FeedItem, known: tuple[int, int, str]) -> FeedItem:
+    width, height, placeholder = known
+    return item.model_copy(
+        update={
+            # Upstream metadata wins, it describes the exact image served
+            "width": item.width or width,
+            "height": item.height or height,
+            "placeholder": item.placeholder or placeholder,
+        }
+    )
+
+
+async def apply_known(feed: Feed) -> Feed:
+    """Fill in the dimensions and placeholders already known for a feed's images."""
+    if not PLACEHOLDERS:
+        return feed
+    urls = [item.image_url for item in feed.items if item.placeholder is None]
+    if not urls:
+        return feed
+    try:
+        known = await run_in_worker(lookup, urls)
+    except sqlite3.Error as e:
+        print(f"Placeholder lookup failed: {e}")
+        return feed
+    if not known:
+        return feed
+    return feed.model_copy(
+        update={
+            "items": [
+                _with_known(item, known[item.image_url]) if item.image_url in known else item
+                for item in feed.items
+            ]
+        }
+    )
+
+
+async def measure_served(url: str) -> None:
+    """
+    Measure an image `/api/image` has served, from the cached original, unless
+    it was measured before. Images that aren't cached yet are left for later.
+    """
+    global _semaphore
+    if url in _measuring:
+        return
+    _measuring.add(url)
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(PLACEHOLDER_CONCURRENCY)
+    try:
+        if await run_in_worker(lookup, [url]):
+            return
+        image = await image_proxy.find_cached(url, None, None)
+        if image is None:
+            return
+        async with _semaphore:
+            width, height, placeholder = await run_in_image_worker(measure, image.path)
+        await run_in_worker(store, url, width, height, placeholder)
+    except Exception as e:
+        print(f"Failed to compute the placeholder of {url}: {e}")
+    finally:
+        _measuring.discard(url)
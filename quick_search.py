@@ -0,0 +1,183 @@
+"""
+Deterministic fast path for /api/search.
+
+Many search queries simply name a source and/or one of its categories:
+"hokusai", "apod 2019", "r/analog", "wikiart monet". These are resolved locally
+from the `get_all_categories()` data in well under a millisecond, and only
+queries this matcher isn't confident about go to the LLM agent.
+
+A query resolves when, after removing an optional source name ("apod",
+"reddit", ...), the rest is:
+  - empty: the source's default gallery,
+  - a subreddit written as r/<name>, or a single word after "reddit",
+  - exactly a category id or name, e.g. "2019", "met", "claude monet",
+  - a word that appears in the name of exactly one category, e.g. "hokusai",
+  - or a close fuzzy match of exactly one category name.
+
+The last two only consider the categories of sources with a stable list of
+names. The Guardian's categories are the headlines of its latest galleries, so
+a word like "cats" would pick whatever gallery mentions them this week; they
+are matched by word or fuzzily only when the query names the Guardian.
+"""
+
+import difflib
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from agent_cache import normalize_query
+from models import BijukaruUrlParams, get_all_categories, media_sources
+
+# Words that name a media source in a query
+SOURCE_ALIASES = {
+    "apod": "apod",
+    "astronomy picture of the day": "apod",
+    "nasa": "apod",
+    "colossal": "thisiscolossal",
+    "this is colossal": "thisiscolossal",
+    "thisiscolossal": "thisiscolossal",
+    "guardian": "guardian",
+    "the guardian": "guardian",
+    "reddit": "reddit",
+    "ukiyo e": "ukiyo-e",
+    "ukiyoe": "ukiyo-e",
+    "wikiart": "wikiart",
+    "wiki art": "wikiart",
+}
+
+SUBREDDIT = re.compile(r"^/?r/([A-Za-z0-9_]{2,21})$")
+
+# Only whole words at least this long pick a category by themselves
+MIN_WORD_LENGTH = 4
+FUZZY_CUTOFF = 0.9
+
+# Sources whose category names change all the time (news gallery headlines)
+UNSTABLE_SOURCES = {"guardian"}
+
+
+@dataclass(frozen=True)
+class _Category:
+    source: str
+    id: str
+    name: str
+
+
+class CategoryIndex:
+    """Lookup tables from normalized category ids, names and name words to categories."""
+
+    def __init__(self, all_categories: dict[str, list[dict]]):
+        self.exact: dict[str, list[_Category]] = {}
+        self.words: dict[str, list[_Category]] = {}
+        self.names: dict[str, list[_Category]] = {}
+        for source, categories in all_categories.items():
+            for category in categories:
+                entry = _Category(source, category["id"], category["name"])
+                name = normalize_query(category["name"])
+                bare_id = normalize_query(category["id"].split(":")[-1])
+                for key in {normalize_query(category["id"]), bare_id, name}:
+                    self.exact.setdefault(key, []).append(entry)
+                self.names.setdefault(name, []).append(entry)
+                for word in set(name.split()) | set(bare_id.split()):
+                    if len(word) >= MIN_WORD_LENGTH:
+                        self.words.setdefault(word, []).append(entry)
+
+    @staticmethod
+    def _candidates(
+        candidates: list[_Category], source: Optional[str], stable_only: bool = False
+    ) -> list[_Category]:
+        if source is not None:
+            return [c for c in candidates if c.source == source]
+        if stable_only:
+            return [c for c in candidates if c.source not in UNSTABLE_SOURCES]
+        return candidates
+
+    @classmethod
+    def _unique(
+        cls, candidates: list[_Category], source: Optional[str], stable_only: bool = False
+    ) -> Optional[_Category]:
+        candidates = cls._candidates(candidates, source, stable_only)
+        return candidates[0] if len(candidates) == 1 else None
+
+    def find(self, text: str, source: Optional[str]) -> Optional[_Category]:
+        """The one category `text` refers to, or None if there isn't exactly one."""
+        if text in self.exact:
+            return self._unique(self.exact[text], source)
+        if " " not in text and text in self.words:
+            return self._unique(self.words[text], source, stable_only=True)
+        names = [
+            name
+            for name, entries in self.names.items()
+            if self._candidates(entries, source, stable_only=True)
+        ]
+        matches = difflib.get_close_matches(text, names, n=2, cutoff=FUZZY_CUTOFF)
+        if len(matches) == 1:
+            return self._unique(self.names[matches[0]], source, stable_only=True)
+        return None
+
+
+_index: Optional[CategoryIndex] = None
+_indexed_categories: Optional[dict] = None
+
+
+async def _category_index() -> CategoryIndex:
+    """The index of the current categories, rebuilt when they are refreshed."""
+    global _index, _indexed_categories
+    all_categories = await get_all_categories()
+    if all_categories is not _indexed_categories:
+        _index = CategoryIndex(all_categories)
+        _indexed_categories = all_categories
+    return _index
+
+
+def _split_source(query: str) -> tuple[Optional[str], str]:
+    """Split a normalized query into the source it names (if any) and the rest."""
+    # Longest aliases first, so "this is colossal" wins over "colossal"
+    for alias in sorted(SOURCE_ALIASES, key=len, reverse=True):
+        if query == alias:
+            return SOURCE_ALIASES[alias], ""
+        if query.startswith(alias + " "):
+            return SOURCE_ALIASES[alias], query[len(alias) + 1 :]
+        if query.endswith(" " + alias):
+            return SOURCE_ALIASES[alias], query[: -len(alias) - 1]
+    return None, query
+
+
+def _source_name(source: str) -> str:
+    """The name a media source is shown with, e.g. "This is Colossal"."""
+    return media_sources[source]["media_source_name"]
+
+
+async def quick_search(query: str) -> Optional[tuple[BijukaruUrlParams, str]]:
+    """
+    Resolve a simple query to gallery parameters without the LLM.
+
+    Returns:
+        The parameters and a user-friendly message, or None if the query needs
+        the LLM agent.
+    """
+    if match := SUBREDDIT.match(query.strip()):
+        subreddit = match.group(1)
+        return (
+            BijukaruUrlParams(media_source="reddit", category=subreddit),
+            f"Showing images from r/{subreddit}.",
+        )
+
+    source, rest = _split_source(normalize_query(query))
+    if source is not None and not rest:
+        return BijukaruUrlParams(media_source=source), f"Showing the {_source_name(source)} gallery."
+    if not rest:
+        return None
+
+    category = (await _category_index()).find(rest, source)
+    if category is None:
+        if source == "reddit" and re.fullmatch(r"[a-z0-9_]{2,21}", rest):
+            # Any subreddit can be shown, not just the listed ones
+            return (
+                BijukaruUrlParams(media_source="reddit", category=rest),
+                f"Showing images from r/{rest}.",
+            )
+        return None
+    return (
+        BijukaruUrlParams(media_source=category.source, category=category.id),
+        f"Showing {category.name} from {_source_name(category.source)}.",
+    )
@@ -1,8 +1,10 @@
-from typing import Any
-import requests
+from operator import itemgetter
+from typing import Any, Optional, TypedDict
+from pydantic import TypeAdapter
+from http_client import USER_AGENT, get_async_client
 from schema import FeedItem, Category, Feed
-from reddit_models import RedditResponse
 from functools import lru_cache
+from workers import run_in_worker
 
 
 class RedditCategory(Category):
@@ -30,71 +32,163 @@ def get_reddit_categories() -> list[RedditCategory]:
     )
 
 
-def get_reddit_feed(category: str, hd: bool = False) -> Feed:
+async def get_reddit_feed(category: str, hd: bool = False) -> Feed:
     url = f"https://www.reddit.com/r/{category}/top.json?t=month&limit=20&raw_json=1"
     # Spoof a browser request
-    response = requests.get(
-        url,
-        headers={
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        },
-    )
+    response = await get_async_client().get(url, headers={"User-Agent": USER_AGENT})
     if response.status_code != 200:
         raise Exception(f"Failed to fetch Reddit feed for category {category}")
-    data = RedditResponse.model_validate_json(response.text)
+    # Parsing the listing is CPU-bound, keep it off the event loop
+    return await run_in_worker(_parse_reddit_feed, response.content, category, hd)
+
+
+# The parts of a /top.json listing a feed reads. Every key is optional, posts
+# missing one are skipped by `_extract_items`; keys not listed here are dropped
+# while the JSON is parsed, rather than decoded into objects first. The full
+# shape of a listing is described by `reddit_models`.
+class _Image(TypedDict, total=False):
+    # Previews use url/width/height, gallery media u/x/y
+    url: str
+    width: int
+    height: int
+    u: str
+    x: int
+    y: int
+
+
+class _PreviewImage(TypedDict, total=False):
+    source: _Image
+    resolutions: list[_Image]
+
+
+class _Preview(TypedDict, total=False):
+    images: list[_PreviewImage]
+    enabled: bool
+
+
+class _Media(TypedDict, total=False):
+    status: str
+    e: str
+    p: list[_Image]
+    s: _Image
+    id: str
+
+
+class _GalleryItem(TypedDict, total=False):
+    media_id: str
+
+
+class _Gallery(TypedDict, total=False):
+    items: list[_GalleryItem]
+
+
+class _Post(TypedDict, total=False):
+    id: str
+    title: str
+    author: Optional[str]
+    permalink: str
+    post_hint: Optional[str]
+    preview: Optional[_Preview]
+    is_gallery: bool
+    gallery_data: Optional[_Gallery]
+    media_metadata: Optional[dict[str, _Media]]
+
+
+class _Child(TypedDict):
+    data: _Post
+
+
+class _Children(TypedDict):
+    children: list[_Child]
+
+
+class _Listing(TypedDict):
+    data: _Children
+
+
+_listing = TypeAdapter(_Listing)
+
+
+def _parse_reddit_feed(content: bytes, category: str, hd: bool) -> Feed:
+    items = _extract_items(_listing.validate_json(content), hd)
+    return Feed(items=items, category=_reddit_category(category))
+
+
+def _extract_items(listing: _Listing, hd: bool) -> list[FeedItem]:
+    """Read the feed items of a parsed listing, skipping malformed posts."""
     items = []
+    skipped = []
+    for child in listing["data"]["children"]:
+        post = child["data"]
+        try:
+            items.extend(_extract_post_items(post, hd))
+        except (KeyError, IndexError, TypeError):
+            skipped.append(post.get("id", "?"))
+    if skipped:
+        print(f"Skipped {len(skipped)} malformed Reddit posts: {', '.join(skipped)}")
+    return items
+
 
-    for post in data.data.children:
-        post_data = post.data
-
-        # Handle gallery posts
-        if post_data.is_gallery and post_data.gallery_data and post_data.media_metadata:
-            for gallery_item in post_data.gallery_data.items:
-                media_id = gallery_item.media_id
-                if media_id in post_data.media_metadata:
-                    image_data = post_data.media_metadata[media_id]
-                    if image_data.status == "valid" and image_data.e == "Image":
-                        # Get the source image (largest size)
-                        if hd:
-                            source = image_data.s
-                        else:
-                            # Get the largest preview image
-                            source = max(image_data.p, key=lambda x: x.width)
-                        if source:
-                            items.append(
-                                FeedItem(
-                                    id=image_data.id,
-                                    title=f"{post_data.title} | {post_data.author}",
-                                    description="",
-                                    image_url=source.url,
-                                    link=f"https://www.reddit.com{post_data.permalink}",
-                                )
-                            )
-
-        # Handle single image posts
-        elif (
-            post_data.post_hint == "image"
-            and post_data.preview
-            and post_data.preview.enabled
-        ):
-            # Get the source image (largest size)
+def _extract_post_items(post: _Post, hd: bool) -> list[FeedItem]:
+    title = f"{post['title']} | {post.get('author')}"
+    link = f"https://www.reddit.com{post['permalink']}"
+    gallery_data = post.get("gallery_data")
+    media_metadata = post.get("media_metadata")
+
+    # Handle gallery posts
+    if post.get("is_gallery") and gallery_data and media_metadata:
+        items = []
+        for gallery_item in gallery_data["items"]:
+            image_data = media_metadata.get(gallery_item["media_id"])
+            if (
+                image_data is None
+                or image_data.get("status") != "valid"
+                or image_data.get("e") != "Image"
+            ):
+                continue
+            # Gallery images are described as {"u": url, "x": width, "y": height}
             if hd:
-                source = post_data.preview.images[0].source
+                source = image_data["s"]
             else:
-                source = max(
-                    post_data.preview.images[0].resolutions, key=lambda x: x.width
-                )
+                source = max(image_data["p"], key=itemgetter("x"), default=None)
             if source:
                 items.append(
                     FeedItem(
-                        id=post_data.id,
-                        title=f"{post_data.title} | {post_data.author}",
+                        id=image_data["id"],
+                        title=title,
                         description="",
-                        image_url=source.url,
-                        link=f"https://www.reddit.com{post_data.permalink}",
+                        image_url=source["u"],
+                        link=link,
+                        width=source["x"],
+                        height=source["y"],
                     )
                 )
+        return items
 
+    # Handle single image posts
+    preview = post.get("preview")
+    if post.get("post_hint") == "image" and preview and preview.get("enabled"):
+        image = preview["images"][0]
+        if hd:
+            source = image["source"]
+        else:
+            source = max(image["resolutions"], key=itemgetter("width"), default=None)
+        if source:
+            return [
+                FeedItem(
+                    id=post["id"],
+                    title=title,
+                    description="",
+                    image_url=source["url"],
+                    link=link,
+                    width=source["width"],
+                    height=source["height"],
+                )
+            ]
+    return []
+
+
+def _reddit_category(category: str) -> RedditCategory:
     category_name = list(
         filter(
             lambda x: x.id == (category if category else ""),
@@ -106,8 +200,10 @@ def get_reddit_feed(category: str, hd: bool = False) -> Feed:
     else:
         category_name = "r/" + category.replace("-", " ").title()
 
-    return Feed(items=items, category=RedditCategory(id=category, name=category_name))
+    return RedditCategory(id=category, name=category_name)
 
 
 if __name__ == "__main__":
-    print(get_reddit_feed("landscapephotography"))
+    import asyncio
+
+    print(asyncio.run(get_reddit_feed("landscapephotography")))
@@ -9,6 +9,11 @@ class FeedItem(BaseModel):
     link: str
     description: Optional[str] = None
     artist_name: Optional[str] = None
+    # Pixel size of the image at image_url, so the frontend can reserve its layout
+    width: Optional[int] = None
+    height: Optional[int] = None
+    # Tiny blurred preview of the image, as a data: URI
+    placeholder: Optional[str] = None
 
 class Category(BaseModel):
     id: str
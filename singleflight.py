@@ -0,0 +1,111 @@
+"""
+Request coalescing ("single-flight") for upstream feed fetches.
+
+When a popular feed's cache entry expires, every concurrent request for it
+misses at the same time. Instead of each one hitting the upstream, only the
+first request fetches; the others wait for and share its result.
+
+Within a process this is done with a shared task per key. When Redis is
+configured, the first worker to take a Redis lock for the key fetches and
+publishes the result under a short-lived Redis key, which the other workers poll
+for instead of fetching themselves.
+
+Configuration (environment variables):
+  - SINGLEFLIGHT_LOCK_TIMEOUT: seconds a worker may hold the Redis lock, and the
+    longest other workers wait for its result before fetching themselves (default 30)
+  - SINGLEFLIGHT_RESULT_TTL: seconds a published result is kept in Redis (default 30)
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T", bound=BaseModel)
+
+SINGLEFLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLEFLIGHT_LOCK_TIMEOUT", 30))
+SINGLEFLIGHT_RESULT_TTL = int(os.getenv("SINGLEFLIGHT_RESULT_TTL", 30))
+
+# How often workers waiting on another worker's fetch check for its result
+POLL_INTERVAL = 0.1
+
+
+class SingleFlight:
+    """Deduplicates concurrent fetches of the same key, optionally across workers."""
+
+    def __init__(self, prefix: str = "bijukaru:singleflight"):
+        self.prefix = prefix
+        self.redis = None
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    def configure(self, redis) -> None:
+        """Coordinate with other workers through this Redis client."""
+        self.redis = redis
+
+    async def do(
+        self, key: str, fetch: Callable[[], Awaitable[T]], model: type[T]
+    ) -> T:
+        """
+        Return the result of `fetch()`, sharing it with every concurrent call for `key`.
+
+        Args:
+            key: Identifies the upstream fetch, e.g. "reddit:analog:False".
+            fetch: Produces the result if no other call is already doing so.
+            model: Pydantic model used to exchange the result through Redis.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            if self.redis is not None:
+                task = asyncio.ensure_future(self._do_across_workers(key, fetch, model))
+            else:
+                task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shielded, so one caller giving up doesn't cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    async def _published_result(self, key: str, model: type[T]) -> Optional[T]:
+        result = await self.redis.get(f"{self.prefix}:result:{key}")
+        return model.model_validate_json(result) if result is not None else None
+
+    async def _do_across_workers(
+        self, key: str, fetch: Callable[[], Awaitable[T]], model: type[T]
+    ) -> T:
+        lock_name = f"{self.prefix}:lock:{key}"
+        deadline = time.monotonic() + SINGLEFLIGHT_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                if (result := await self._published_result(key, model)) is not None:
+                    return result
+                lock = self.redis.lock(lock_name, timeout=SINGLEFLIGHT_LOCK_TIMEOUT)
+                acquired = await lock.acquire(blocking=False)
+            except Exception as e:
+                print(f"Single-flight coordination failed for {key}, fetching directly: {e}")
+                return await fetch()
+            if acquired:
+                try:
+                    result = await fetch()
+                    try:
+                        await self.redis.set(
+                            f"{self.prefix}:result:{key}",
+                            result.model_dump_json(),
+                            ex=SINGLEFLIGHT_RESULT_TTL,
+                        )
+                    except Exception as e:
+                        print(f"Failed to publish single-flight result for {key}: {e}")
+                    return result
+                finally:
+                    try:
+                        await lock.release()
+                    except Exception:
+                        # The lock expired while we were fetching
+                        pass
+            # Another worker is fetching, wait for it to publish its result
+            await asyncio.sleep(POLL_INTERVAL)
+        # The other worker took too long, don't keep the user waiting any longer
+        return await fetch()
+
+
+single_flight = SingleFlight()
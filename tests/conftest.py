@@ -0,0 +1,41 @@
+"""
+Shared fixtures. tests/fixtures holds upstream responses next to the expected
+parser output for each one as JSON. The responses are small and written by
+hand in each upstream's format, to cover the cases the parsers must handle;
+they are not recordings. The expected output was produced by the slower
+parsers the current ones replaced (see benchmarks/parsers.py); update it when
+a parser's output is meant to change.
+"""
+
+import json
+import os
+
+import pytest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def fixture_path(name: str) -> str:
+    return os.path.join(FIXTURES, name)
+
+
+@pytest.fixture
+def read_fixture():
+    """Read an upstream response fixture as bytes."""
+
+    def read(name: str) -> bytes:
+        with open(fixture_path(name), "rb") as f:
+            return f.read()
+
+    return read
+
+
+@pytest.fixture
+def read_golden():
+    """Read the expected output of a parser."""
+
+    def read(name: str):
+        with open(fixture_path(name), encoding="utf-8") as f:
+            return json.load(f)
+
+    return read
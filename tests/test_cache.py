@@ -0,0 +1,50 @@
+import asyncio
+
+from cache import FeedCache, FeedCacheBackend
+
+
+def test_least_recently_used_entries_are_evicted_over_the_byte_budget():
+    cache = FeedCache(max_bytes=10)
+    cache.set("feeds", "a", b"aaaa", 60)
+    cache.set("feeds", "b", b"bbbb", 60)
+    assert cache.get("feeds", "a") is not None
+    cache.set("feeds", "c", b"cccc", 60)
+    assert cache.get("feeds", "b") is None
+    assert cache.get("feeds", "a")[0] == b"aaaa"
+    assert cache.stats()["feeds"]["evictions"] == 1
+
+
+def test_entries_are_evicted_over_the_entry_cap():
+    cache = FeedCache(max_bytes=1024, max_entries=2)
+    for key in "abc":
+        cache.set("feeds", key, b"x", 60)
+    assert [key for key in "abc" if cache.get("feeds", key)] == ["b", "c"]
+
+
+def test_backend_keys_from_requests_stay_within_budget():
+    cache = FeedCache(max_bytes=1024 * 1024, max_entries=100)
+    backend = FeedCacheBackend(cache)
+
+    async def fill():
+        for i in range(1000):
+            await backend.set(f"bijukaru:feed:apod:search:term {i}:False", b"{}", expire=600)
+        return await backend.get_with_ttl("bijukaru:feed:apod:search:term 999:False")
+
+    ttl, value = asyncio.run(fill())
+    assert value == b"{}" and 0 < ttl <= 600
+    assert cache.stats()["responses"]["entries"] == 100
+
+
+def test_backend_clears_by_namespace_and_key():
+    backend = FeedCacheBackend(FeedCache(max_bytes=1024))
+
+    async def clear():
+        await backend.set("bijukaru:feed:a", b"1")
+        await backend.set("bijukaru:feed:b", b"2")
+        await backend.set("bijukaru:other", b"3")
+        assert await backend.get_with_ttl("bijukaru:other") == (-1, b"3")
+        assert await backend.clear(key="bijukaru:feed:a") == 1
+        assert await backend.clear(namespace="bijukaru:feed") == 1
+        return [await backend.get(key) for key in ("bijukaru:feed:b", "bijukaru:other")]
+
+    assert asyncio.run(clear()) == [None, b"3"]
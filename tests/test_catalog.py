@@ -0,0 +1,46 @@
+import pytest
+
+import catalog
+from schema import Category, Feed, FeedItem
+
+
+@pytest.fixture
+def recorded(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog, "CATALOG_PATH", str(tmp_path / "catalog.sqlite3"))
+    feed = Feed(
+        items=[
+            FeedItem(
+                id="starry-night",
+                title="The Starry Night",
+                artist_name="Vincent van Gogh",
+                image_url="https://example.org/starry-night.jpg",
+                link="https://example.org/starry-night",
+            ),
+            FeedItem(
+                id="night-watch",
+                title="The Night Watch",
+                artist_name="Rembrandt",
+                image_url="https://example.org/night-watch.jpg",
+                link="https://example.org/night-watch",
+            ),
+        ],
+        category=Category(id="masterpieces", name="Masterpieces"),
+    )
+    catalog.record_feed("wikiart", feed)
+
+
+def ids(query: str) -> list[str]:
+    return [item.id for _, item in catalog.search(query)]
+
+
+def test_items_matching_every_word_come_alone(recorded):
+    assert ids("starry night") == ["starry-night"]
+
+
+def test_any_word_matches_when_no_item_has_them_all(recorded):
+    assert ids("Starry Night (1889)") == ["starry-night", "night-watch"]
+    assert ids("Rembrandt's watch") == ["night-watch"]
+
+
+def test_empty_queries_match_nothing(recorded):
+    assert ids(' " ') == []
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi_cache import FastAPICache
+
+import apod
+import catalog
+from cache import FeedCache, FeedCacheBackend
+import feed_store
+import feeds
+import guardian_photos
+from feeds import FEED_INCOMPLETE_EXPIRE, FEED_SOURCES, feed_key
+from schema import Category, Feed, FeedItem
+
+
+@pytest.fixture
+def feed_cache(tmp_path, monkeypatch):
+    FastAPICache.init(FeedCacheBackend(FeedCache(max_bytes=1024 * 1024)), prefix="test")
+    monkeypatch.setattr(feed_store, "FEED_STORE_PATH", "")
+    monkeypatch.setattr(catalog, "CATALOG_PATH", str(tmp_path / "catalog.sqlite3"))
+
+
+def upstream_returning(monkeypatch, module, status_code: int, content: bytes = b"") -> None:
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(
+            lambda request: httpx.Response(status_code, content=content)
+        )
+    )
+    monkeypatch.setattr(module, "get_async_client", lambda: client)
+
+
+def test_apod_searches_expire_early_until_the_archive_is_backfilled(monkeypatch):
+    monkeypatch.setattr(apod, "_backfilled", False)
+    assert FEED_SOURCES["apod"].expire_for("search:galaxies") == FEED_INCOMPLETE_EXPIRE
+    assert FEED_SOURCES["apod"].expire_for("2025") == FEED_SOURCES["apod"].expire
+
+    monkeypatch.setattr(apod, "_backfilled", True)
+    assert FEED_SOURCES["apod"].expire_for("search:galaxies") == FEED_SOURCES["apod"].expire
+
+
+def test_stale_feeds_are_served_while_the_upstream_fails(feed_cache, monkeypatch):
+    category = "news__gallery__2025__may__01__photos"
+    stale = Feed(
+        items=[
+            FeedItem(
+                id="img-1",
+                title="Photo",
+                image_url="https://i.guim.co.uk/img/1.jpg",
+                link="https://www.theguardian.com/news/gallery#img-1",
+            )
+        ],
+        category=Category(id=category, name="Photos"),
+    ).model_dump_json().encode()
+    # An error page without a gallery in it
+    upstream_returning(
+        monkeypatch, guardian_photos, 503, b"<html><body>Service unavailable</body></html>"
+    )
+
+    async def no_category(category_id):
+        return None
+
+    monkeypatch.setattr(guardian_photos, "get_guardian_category", no_category)
+
+    async def serve():
+        key = feed_key("guardian", category)
+        await feeds._store(key, stale, time.time() - 1)
+        revalidated = await feeds.get_feed_json("guardian", category, revalidate=True)
+        served = await feeds.get_feed_json("guardian", category)
+        await asyncio.gather(*feeds._refreshing.values())
+        return revalidated, served, await feeds._read_cached(key)
+
+    revalidated, served, (_, cached) = asyncio.run(serve())
+    assert revalidated == served == cached == stale
+
+
+def test_failed_apod_fetches_raise(monkeypatch):
+    upstream_returning(monkeypatch, apod, 502)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(apod.get_apod_feed("2024"))
+
+
+def test_cached_feeds_are_read_without_fetching(feed_cache):
+    feed_json = Feed(items=[], category=Category(id="met", name="Met")).model_dump_json().encode()
+
+    async def read():
+        missing = await feeds.get_cached_feed_json("ukiyo-e", "met", pages=2)
+        await feeds._store(feed_key("ukiyo-e", "met", pages=2), feed_json, time.time() + 60)
+        return missing, await feeds.get_cached_feed_json("ukiyo-e", "met", pages=2)
+
+    assert asyncio.run(read()) == (None, feed_json)
+    assert not feeds._refreshing
+
+
+def test_agent_lookups_arent_counted_for_the_warmer(feed_cache, monkeypatch):
+    feed_json = Feed(items=[], category=Category(id="analog", name="analog")).model_dump_json().encode()
+    monkeypatch.setattr(feeds, "feed_access", feeds.Counter())
+
+    async def look_up():
+        await feeds._store(feed_key("reddit", "analog"), feed_json, time.time() + 60)
+        await feeds.get_feed("reddit", "analog", count_access=False)
+        await feeds.get_feed("reddit", "analog")
+
+    asyncio.run(look_up())
+    assert feeds.feed_access == {("reddit", "analog"): 1}
@@ -0,0 +1,16 @@
+from guardian_photos import _parse_gallery
+from schema import FeedItem
+
+
+def test_parse_gallery(read_fixture, read_golden):
+    html = read_fixture("guardian_gallery.html").decode()
+    expected = [FeedItem(**item) for item in read_golden("guardian_gallery.json")]
+    assert _parse_gallery(html) == expected
+
+
+def test_parse_gallery_skips_ads_and_picks_the_widest_source(read_fixture):
+    items = _parse_gallery(read_fixture("guardian_gallery.html").decode())
+    assert [item.id for item in items] == ["img-1", "img-2", "img-3", "img-4", "img-5"]
+    assert "width=1900" in items[1].image_url
+    # Photos without <source>s fall back to the <img>
+    assert "width=445" in items[2].image_url
@@ -0,0 +1,40 @@
+import asyncio
+
+import httpx
+import pytest
+
+import image_proxy
+from image_proxy import ImageProxyError, stream_original
+
+URL = "https://uploads.wikiart.org/images/hokusai/the-great-wave.jpg"
+
+
+def upstream_returning(monkeypatch, content_type: str) -> None:
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(
+            lambda request: httpx.Response(
+                200, content=b"<svg/>", headers={"content-type": content_type}
+            )
+        )
+    )
+    monkeypatch.setattr(image_proxy, "get_async_client", lambda: client)
+
+
+def test_only_raster_images_are_proxied(monkeypatch):
+    upstream_returning(monkeypatch, "image/svg+xml")
+    with pytest.raises(ImageProxyError) as e:
+        asyncio.run(stream_original(URL))
+    assert e.value.status_code == 502
+
+
+def test_originals_can_be_closed_without_reading_the_body(monkeypatch):
+    upstream_returning(monkeypatch, "image/jpeg; charset=binary")
+
+    async def open_and_close():
+        media_type, body, close = await stream_original(URL)
+        await close()
+        return media_type, close.__self__
+
+    media_type, response = asyncio.run(open_and_close())
+    assert media_type == "image/jpeg; charset=binary"
+    assert response.is_closed
@@ -0,0 +1,135 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+# The agents are created at import time and need a key, but never call the API here
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+import artwork_memo  # noqa: E402
+import llm_research  # noqa: E402
+from llm_research import (  # noqa: E402
+    CuratedFeed,
+    NarrativeItem,
+    _fully_researched,
+    _placeholder_item,
+    research_narrative_item,
+    stream_curated_feed,
+)
+from schema import Category, FeedItem  # noqa: E402
+
+
+@pytest.fixture
+def memo(tmp_path, monkeypatch):
+    monkeypatch.setattr(artwork_memo, "ARTWORK_MEMO_PATH", str(tmp_path / "memo.sqlite3"))
+
+
+def researcher_returning(monkeypatch, item: FeedItem) -> list[str]:
+    """Replace the Detail Researcher with one returning `item`; returns its calls."""
+    calls = []
+
+    async def run(prompt):
+        calls.append(prompt)
+        return SimpleNamespace(output=item)
+
+    monkeypatch.setattr(llm_research.detail_researcher_agent, "run", run)
+    return calls
+
+
+def research(title: str, artist: str) -> FeedItem:
+    item = NarrativeItem(title=title, artist=artist, narrative_description="Why")
+    return asyncio.run(research_narrative_item(0, 1, item))
+
+
+def test_found_artworks_are_memoized(memo, monkeypatch):
+    calls = researcher_returning(
+        monkeypatch,
+        FeedItem(
+            id="great-wave",
+            title="The Great Wave off Kanagawa",
+            artist_name="Katsushika Hokusai",
+            image_url="https://example.org/great-wave.jpg",
+            link="https://example.org/great-wave",
+        ),
+    )
+    research("The Great Wave off Kanagawa", "Hokusai")
+    item = research("Great Wave off Kanagawa", "Katsushika Hokusai")
+    assert len(calls) == 1
+    assert item.image_url == "https://example.org/great-wave.jpg"
+    assert item.description == "Why"
+
+
+def test_failed_lookups_are_not_memoized(memo, monkeypatch):
+    # What the researcher is told to return when it can't find the artwork
+    calls = researcher_returning(
+        monkeypatch,
+        FeedItem(
+            id="great-wave",
+            title="The Great Wave off Kanagawa",
+            artist_name="Hokusai",
+            image_url="",
+            link="",
+        ),
+    )
+    research("The Great Wave off Kanagawa", "Hokusai")
+    assert artwork_memo.lookup("Great Wave off Kanagawa", "Katsushika Hokusai") is None
+    research("Great Wave off Kanagawa", "Katsushika Hokusai")
+    assert len(calls) == 2
+
+
+def test_memo_failures_fall_through_to_research(memo, monkeypatch):
+    found = FeedItem(
+        id="great-wave",
+        title="The Great Wave off Kanagawa",
+        image_url="https://example.org/great-wave.jpg",
+        link="https://example.org/great-wave",
+    )
+    calls = researcher_returning(monkeypatch, found)
+
+    def corrupt(*args):
+        raise ValueError("stored item doesn't validate")
+
+    monkeypatch.setattr(artwork_memo, "lookup", corrupt)
+    monkeypatch.setattr(artwork_memo, "remember", corrupt)
+    item = research("The Great Wave off Kanagawa", "Hokusai")
+    assert len(calls) == 1
+    assert item.image_url == "https://example.org/great-wave.jpg"
+
+
+def curated_feed(*items: FeedItem) -> CuratedFeed:
+    return CuratedFeed(
+        items=list(items),
+        category=Category(id="narrative:waves", name="Waves"),
+        llm_thinking="",
+        userfriendly_message="",
+    )
+
+
+def test_feeds_with_items_that_werent_found_arent_fully_researched():
+    found = FeedItem(
+        id="a", title="A", image_url="https://example.org/a.jpg", link="https://example.org/a"
+    )
+    not_found = FeedItem(id="b", title="B", image_url="", link="")
+    placeholder = _placeholder_item(2, NarrativeItem(title="C", narrative_description="Why"))
+    assert _fully_researched(curated_feed(found))
+    assert not _fully_researched(curated_feed(found, not_found))
+    assert not _fully_researched(curated_feed(found, placeholder))
+
+
+def test_stream_reports_curator_errors(monkeypatch):
+    async def no_cache(*args):
+        return None
+
+    async def run(prompt):
+        raise TimeoutError("quota exceeded")
+
+    monkeypatch.setattr(llm_research, "get_cached", no_cache)
+    monkeypatch.setattr(llm_research.story_curator_agent, "run", run)
+
+    async def collect():
+        return [event async for event in stream_curated_feed("waves")]
+
+    assert asyncio.run(collect()) == [
+        {"type": "error", "error": "Could not generate curated feed for the query."}
+    ]
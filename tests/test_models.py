@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+import pytest
+
+import models
+from models import ALL_CATEGORIES_TTL, get_default_category
+from schema import Category
+
+
+@pytest.fixture
+def fetchers(monkeypatch):
+    monkeypatch.setattr(models, "_default_categories", {})
+    fetchers = dict(models.CATEGORY_FETCHERS)
+    monkeypatch.setattr(models, "CATEGORY_FETCHERS", fetchers)
+    return fetchers
+
+
+def test_default_category_is_the_first_category(fetchers):
+    fetchers["reddit"] = lambda: [Category(id="pics", name="Pics")]
+    assert asyncio.run(get_default_category("reddit")) == "pics"
+
+
+def test_default_category_falls_back_to_the_last_one_when_none_are_fetched(fetchers):
+    models._default_categories["guardian"] = (
+        time.monotonic() - ALL_CATEGORIES_TTL - 1,
+        "news__gallery__2025__may__01__photos",
+    )
+
+    async def no_categories():
+        return []
+
+    fetchers["guardian"] = no_categories
+    assert (
+        asyncio.run(get_default_category("guardian"))
+        == "news__gallery__2025__may__01__photos"
+    )
+
+
+def test_default_category_falls_back_to_a_static_one(fetchers):
+    def down():
+        raise ConnectionError("down")
+
+    fetchers["reddit"] = down
+    fetchers["guardian"] = down
+    assert asyncio.run(get_default_category("reddit")) == "analog"
+    with pytest.raises(LookupError):
+        asyncio.run(get_default_category("guardian"))
@@ -0,0 +1,21 @@
+import asyncio
+
+import quick_search
+
+
+def search(query: str, monkeypatch):
+    async def get_all_categories():
+        return {"ukiyo-e": [{"id": "artist:katsushika-hokusai", "name": "Katsushika Hokusai"}]}
+
+    monkeypatch.setattr(quick_search, "get_all_categories", get_all_categories)
+    return asyncio.run(quick_search.quick_search(query))
+
+
+def test_messages_name_sources_as_the_ui_does(monkeypatch):
+    params, message = search("this is colossal", monkeypatch)
+    assert params.media_source == "thisiscolossal"
+    assert message == "Showing the This is Colossal gallery."
+
+    params, message = search("hokusai", monkeypatch)
+    assert params.category == "artist:katsushika-hokusai"
+    assert message == "Showing Katsushika Hokusai from Ukiyo-e."
@@ -0,0 +1,33 @@
+import orjson
+
+from reddit import _extract_items, _listing, _parse_reddit_feed
+from reddit_models import RedditResponse
+from schema import FeedItem
+
+
+def test_listing_matches_the_models(read_fixture):
+    listing = RedditResponse.model_validate_json(read_fixture("reddit_analog_top.json"))
+    assert len(listing.data.children) == 7
+
+
+def test_parse_reddit_feed(read_fixture, read_golden):
+    content = read_fixture("reddit_analog_top.json")
+    expected = [FeedItem(**item) for item in read_golden("reddit_analog_items.json")]
+    assert _parse_reddit_feed(content, "analog", hd=False).items == expected
+
+
+def test_parse_reddit_feed_hd(read_fixture, read_golden):
+    content = read_fixture("reddit_analog_top.json")
+    expected = [FeedItem(**item) for item in read_golden("reddit_analog_hd_items.json")]
+    assert _parse_reddit_feed(content, "analog", hd=True).items == expected
+
+
+def test_malformed_posts_are_skipped_and_logged_once(read_fixture, capsys):
+    listing = orjson.loads(read_fixture("reddit_analog_top.json"))
+    posts = [child["data"] for child in listing["data"]["children"]]
+    del posts[0]["permalink"]
+    # An unprocessed gallery image has no sizes yet
+    del posts[1]["media_metadata"]["abc1g"]["p"]
+    items = _extract_items(_listing.validate_json(orjson.dumps(listing)), hd=False)
+    assert [item.id for item in items] == ["1k2x9q", "1k6x9q"]
+    assert capsys.readouterr().out == "Skipped 2 malformed Reddit posts: 1k0x9q, 1k1x9q\n"
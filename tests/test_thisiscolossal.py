@@ -0,0 +1,37 @@
+import asyncio
+
+import httpx
+import pytest
+
+import thisiscolossal
+from schema import FeedItem
+from thisiscolossal import parse_feed
+
+
+def parse(rss: bytes, chunk_size: int) -> list[FeedItem]:
+    async def chunks():
+        for start in range(0, len(rss), chunk_size):
+            yield rss[start : start + chunk_size]
+
+    async def collect():
+        return [item async for item in parse_feed(chunks())]
+
+    return asyncio.run(collect())
+
+
+def test_parse_feed(read_fixture, read_golden):
+    expected = [FeedItem(**item) for item in read_golden("colossal_feed.json")]
+    assert parse(read_fixture("colossal_feed.xml"), 65536) == expected
+
+
+def test_parse_feed_in_small_chunks(read_fixture, read_golden):
+    # Chunk boundaries fall inside tags, CDATA sections and multi-byte characters
+    expected = [FeedItem(**item) for item in read_golden("colossal_feed.json")]
+    assert parse(read_fixture("colossal_feed.xml"), 7) == expected
+
+
+def test_failed_fetches_raise(monkeypatch):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(503)))
+    monkeypatch.setattr(thisiscolossal, "get_async_client", lambda: client)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(thisiscolossal.get_thisiscolossal_feed("art"))
@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+import orjson
+import pytest
+
+import ukiyoe
+from schema import Category, Feed, FeedItem
+from ukiyoe import cluster_items
+
+
+def test_cluster_items_of_an_artist_page(read_fixture, read_golden):
+    data = orjson.loads(read_fixture("ukiyoe_artist.data"))
+    expected = [FeedItem(**item) for item in read_golden("ukiyoe_artist.json")]
+    assert cluster_items(data, None) == expected
+
+
+def test_strings_starting_with_a_source_id_dont_start_a_cluster(read_fixture):
+    # The regex clusterer matched any string starting with a source id, so
+    # "metropolitan ..." (source "metro") started a bogus cluster and the image
+    # before it lost its title and description
+    data = orjson.loads(read_fixture("ukiyoe_artist.data"))
+    item = next(item for item in cluster_items(data, None) if item.id == "1925.3375")
+    assert item.title == "metropolitan street at dusk, a later reprint"
+    assert item.description == "Color woodblock print; oban"
+
+
+def test_cluster_items_of_a_source_page(read_fixture):
+    data = orjson.loads(read_fixture("ukiyoe_artist.data"))
+    items = cluster_items(data, "met")
+    assert [item.id for item in items] == ["JP1847", "JP2506", "JP3110"]
+    assert items[0].image_url == "https://data.ukiyo-e.org/met/images/JP1847.jpg"
+    assert items[0].link == "https://ukiyo-e.org/image/met/JP1847"
+
+
+def test_pages_are_combined_in_page_order_without_failed_ones(monkeypatch):
+    async def get_feed(category, start):
+        # Later pages finish first
+        await asyncio.sleep(0.001 * (1000 - start) / 100)
+        if start == 200:
+            raise httpx.ConnectError("down")
+        return Feed(
+            items=[FeedItem(id=str(start), title="", image_url="", link="")],
+            category=Category(id=category, name=category),
+        )
+
+    monkeypatch.setattr(ukiyoe, "get_ukiyo_e_feed", get_feed)
+    feed = asyncio.run(ukiyoe.get_ukiyo_e_pages("met", pages=4))
+    assert [item.id for item in feed.items] == ["1", "100", "300"]
+
+
+def test_pages_raise_if_every_page_failed(monkeypatch):
+    async def get_feed(category, start):
+        raise httpx.ConnectError("down")
+
+    monkeypatch.setattr(ukiyoe, "get_ukiyo_e_feed", get_feed)
+    with pytest.raises(Exception):
+        asyncio.run(ukiyoe.get_ukiyo_e_pages("met", pages=2))
+
+
+def test_concurrent_fetches_of_a_page_share_one_request(monkeypatch):
+    calls = []
+
+    async def get_feed(category, start):
+        calls.append(start)
+        await asyncio.sleep(0.01)
+        return Feed(items=[], category=Category(id=category, name=category))
+
+    monkeypatch.setattr(ukiyoe, "get_ukiyo_e_feed", get_feed)
+
+    async def fetch_twice():
+        return await asyncio.gather(
+            ukiyoe.get_ukiyo_e_pages("met", pages=2), ukiyoe.get_ukiyo_e_pages("met", pages=2)
+        )
+
+    asyncio.run(fetch_twice())
+    assert sorted(calls) == [1, 100]
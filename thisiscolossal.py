@@ -1,8 +1,9 @@
 from schema import Category, FeedItem, Feed
-from typing import Any, Optional
-import httpx
+from typing import Any, AsyncIterable, AsyncIterator, Iterator, Optional
+from http_client import get_async_client
+from html import unescape
+import re
 import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
 from functools import lru_cache
 
 
@@ -39,65 +40,87 @@ def get_thisiscolossal_categories():
     return categories
 
 
-async def get_thisiscolossal_feed(category: Optional[str] = "all-posts"):
+CONTENT_ENCODED = "{http://purl.org/rss/1.0/modules/content/}encoded"
+
+# The first <img> tag of an HTML snippet (attribute values may contain ">"), and
+# its src attribute. Not "data-src" or "srcset".
+IMG_TAG = re.compile(r"""<img\b((?:[^>"']|"[^"]*"|'[^']*')*)>""", re.IGNORECASE)
+SRC_ATTRIBUTE = re.compile(
+    r"""(?:^|\s)src\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.IGNORECASE
+)
+# Markup to strip from descriptions: comments and start or end tags
+MARKUP = re.compile(r"<!--.*?-->|</?[a-zA-Z][^>]*>", re.DOTALL)
+
+
+def _first_image(html: str) -> str:
+    """The src of the first <img> in an HTML snippet, or an empty string."""
+    tag = IMG_TAG.search(html)
+    if tag is None:
+        return ""
+    src = SRC_ATTRIBUTE.search(tag.group(1))
+    if src is None:
+        return ""
+    return unescape(src.group(1) or src.group(2) or src.group(3) or "")
+
+
+def _html_text(html: str) -> str:
+    """The text of an HTML snippet, like BeautifulSoup's `get_text()`."""
+    if "<" not in html and "&" not in html:
+        return html
+    return unescape(MARKUP.sub("", html))
+
+
+def _parse_item(item: ET.Element) -> Optional[FeedItem]:
+    """A feed item from an RSS <item>, or None if it has no image."""
+    image_url = _first_image(item.findtext(CONTENT_ENCODED) or "")
+    if not image_url:
+        return None
+    link = item.findtext("link", "#")
+    return FeedItem(
+        id=link.removesuffix("/").split("/")[-1],
+        title=item.findtext("title", "No Title"),
+        image_url=image_url,
+        link=link,
+        description=_html_text(item.findtext("description") or ""),
+    )
+
+
+def _read_items(parser: ET.XMLPullParser) -> Iterator[FeedItem]:
+    """Yield the items that `parser` has finished parsing, freeing each one."""
+    for _, element in parser.read_events():
+        if element.tag == "item":
+            item = _parse_item(element)
+            # Drop the item's subtree, only the parsed item is needed from here
+            element.clear()
+            if item is not None:
+                yield item
+
+
+async def parse_feed(chunks: AsyncIterable[bytes]) -> AsyncIterator[FeedItem]:
+    """
+    Parse an RSS feed as it downloads, rather than once it has all arrived,
+    yielding its items that have an image.
+    """
+    parser = ET.XMLPullParser(events=("end",))
+    async for chunk in chunks:
+        parser.feed(chunk)
+        for item in _read_items(parser):
+            yield item
+    parser.close()
+    for item in _read_items(parser):
+        yield item
+
+
+async def get_thisiscolossal_feed(category: Optional[str] = "all-posts") -> Feed:
     # Construct the feed URL based on the category
     if category != "all-posts":
         feed_url = f"https://www.thisiscolossal.com/category/{category}/feed/"
     else:
         feed_url = "https://www.thisiscolossal.com/feed/"
 
-    # Fetch the RSS feed
-    async with httpx.AsyncClient() as client:
-        response = await client.get(feed_url)
-
-    if response.status_code != 200:
-        return []
-
-    # Parse the XML
-    root = ET.fromstring(response.text)
-
-    # Find the namespace
-    ns = {"content": "http://purl.org/rss/1.0/modules/content/"}
-
-    items = []
-    for item in root.findall(".//item"):
-        title = (
-            item.find("title").text if item.find("title") is not None else "No Title"
-        )
-        link = item.find("link").text if item.find("link") is not None else "#"
-        slug = item.find("link").text.removesuffix("/").split("/")[-1]
-
-        # Extract the content
-        content_element = item.find(".//content:encoded", ns)
-        content = content_element.text if content_element is not None else ""
-
-        # Parse the HTML content to find the first image
-        soup = BeautifulSoup(content, "html.parser")
-        img_tag = soup.find("img")
-
-        image_url = ""
-        if img_tag and img_tag.get("src"):
-            image_url = img_tag.get("src")
-
-        # Get a short description
-        description_element = item.find("description")
-        description = ""
-        if description_element is not None and description_element.text:
-            # Clean HTML tags
-            soup = BeautifulSoup(description_element.text, "html.parser")
-            description = soup.get_text()
-
-        # Only add items that have images
-        if image_url:
-            items.append(
-                FeedItem(
-                    id=slug,
-                    title=title,
-                    image_url=image_url,
-                    link=link,
-                    description=description,
-                )
-            )
+    async with get_async_client().stream("GET", feed_url) as response:
+        response.raise_for_status()
+        items = [item async for item in parse_feed(response.aiter_bytes())]
 
     category_name = list(
         filter(
@@ -1,9 +1,18 @@
+import asyncio
+import os
+from typing import AsyncIterator
 from bs4 import BeautifulSoup
-import requests
+from http_client import get_async_client
 from schema import Feed, FeedItem, Category
+from singleflight import single_flight
 import orjson
 import re
 from functools import lru_cache
+from workers import run_in_worker
+
+# Number of pages fetched for a feed, and how many of them may be in flight at once
+UKIYOE_PAGES = int(os.getenv("UKIYOE_PAGES", "4"))
+UKIYOE_PAGE_CONCURRENCY = int(os.getenv("UKIYOE_PAGE_CONCURRENCY", "4"))
 
 @lru_cache(maxsize=1)
 def get_ukiyo_e_categories() -> list[Category]:
@@ -17,49 +26,71 @@ def get_ukiyo_e_categories() -> list[Category]:
     ]
     return categories
 
+@lru_cache(maxsize=1)
+def _category_ids() -> frozenset[str]:
+    return frozenset(category.id for category in get_ukiyo_e_categories())
+
+
+def _feed_item(cluster: list) -> FeedItem | None:
+    """A FeedItem from a cluster of [id, title, description], or None if it is malformed."""
+    id, title, description, *_ = cluster + [""] * (3 - len(cluster))
+    try:
+        _category, id = id.split("/")
+        return FeedItem(
+            id=id,
+            title=title,
+            description=description,
+            image_url=f"https://data.ukiyo-e.org/{_category}/images/{id}.jpg",
+            link=f"https://ukiyo-e.org/image/{_category}/{id}",
+        )
+    except ValueError:
+        return None
+
+
 def cluster_items(data_array: list[any], category: str | None) -> list[FeedItem]:
     """
     Clusters items into a list of FeedItems, based on the patterns in the data_array.
 
+    A cluster starts at an image id string (`"<category>/<id>"`), followed by its
+    title and description, and ends at the next id or JavaScript object. Items are
+    built as each cluster ends, in a single pass over the array.
+
     If category is None, it assumes the items are artist items, which means that the category could be anything.
     """
-    clusters = []
-    current_cluster = None
-    all_category_ids = "|".join([cat.id for cat in get_ukiyo_e_categories()])
+    prefix = category + "/" if category else None
+    category_ids = _category_ids()
+    items = []
+    # The first values of the cluster being read, only [id, title, description] are used
+    cluster = None
 
     for item in data_array:
-        # Check if this is a string that starts with 'met/'
-        if isinstance(item, str) and (item.startswith(category + '/') if category else re.match(rf"^{all_category_ids}/", item)):
-            # Start a new cluster
-            if current_cluster is not None:
-                clusters.append(current_cluster)
-            current_cluster = [item]
-        # If we're in a cluster and this is not a dictionary (JavaScript object)
-        elif current_cluster is not None and not isinstance(item, dict) and (item not in ["title", "author"]):
-            current_cluster.append(item)
-        # If we encounter a dictionary and we're in a cluster, end the cluster
-        elif isinstance(item, dict) and current_cluster is not None:
-            clusters.append(current_cluster)
-            current_cluster = None
-
-    # Don't forget to add the last cluster if it exists
-    if current_cluster is not None:
-        clusters.append(current_cluster)
-
-    # Turn lists into FeedItems
-    items = []
-    for cluster in clusters:
-        id, title, description, *_ = cluster + [""] * (4 - len(cluster))
-        try:
-            _category, id = id.split("/")
-            items.append(FeedItem(id=id, title=title, description=description, image_url=f"https://data.ukiyo-e.org/{_category}/images/{id}.jpg", link=f"https://ukiyo-e.org/image/{_category}/{id}"))
-        except ValueError:
-            pass
+        if isinstance(item, str):
+            if prefix is not None:
+                starts_cluster = item.startswith(prefix)
+            else:
+                item_category, slash, _ = item.partition("/")
+                starts_cluster = slash != "" and item_category in category_ids
+            if starts_cluster:
+                if cluster is not None and (feed_item := _feed_item(cluster)):
+                    items.append(feed_item)
+                cluster = [item]
+                continue
+        if isinstance(item, dict):
+            # A JavaScript object ends the cluster
+            if cluster is not None and (feed_item := _feed_item(cluster)):
+                items.append(feed_item)
+            cluster = None
+        elif cluster is not None and len(cluster) < 3 and item not in ("title", "author"):
+            cluster.append(item)
+
+    # Don't forget the last cluster if it exists
+    if cluster is not None and (feed_item := _feed_item(cluster)):
+        items.append(feed_item)
 
     return items
 
 
-def get_ukiyo_e_feed(category: str, start: int = 1) -> Feed:
+async def get_ukiyo_e_feed(category: str, start: int = 1) -> Feed:
     if not category.startswith("artist:"):
         url = f"https://ukiyo-e.org/source/{category}.data?start={start}"
         cluster_category = category
@@ -68,10 +99,9 @@ def get_ukiyo_e_feed(category: str, start: int = 1) -> Feed:
         url = f"https://ukiyo-e.org/artist/{category.removeprefix('artist:')}.data?start={start}"
         category = category.removeprefix("artist:")
         cluster_category = None
-    response = requests.get(url, allow_redirects=True)
-    json_data = orjson.loads(response.content.decode("utf-8"))
-
-    items = cluster_items(json_data, cluster_category)
+    response = await get_async_client().get(url)
+    response.raise_for_status()
+    items = await run_in_worker(_parse_ukiyo_e_page, response.content, cluster_category)
 
     category_name = list(
         filter(
@@ -87,6 +117,73 @@ def get_ukiyo_e_feed(category: str, start: int = 1) -> Feed:
     return Feed(items=items, category=Category(id=category, name=category_name))
 
 
+def _page_starts(pages: int) -> list[int]:
+    """ukiyo-e.org pages are addressed by their first result: 1, 100, 200, ..."""
+    return [1] + [100 * page for page in range(1, pages)]
+
+
+async def iter_ukiyo_e_pages(
+    category: str, pages: int | None = None, concurrency: int | None = None
+) -> AsyncIterator[tuple[int, Feed]]:
+    """
+    Fetch the pages of a feed concurrently and yield `(start, feed)` for each page
+    as soon as it has been parsed, in completion order.
+
+    Pages that fail are logged and skipped, so a single bad page does not take
+    the rest of the feed down with it. Concurrent fetches of the same page, e.g.
+    by a feed request and a streamed one, share a single upstream request.
+    """
+    semaphore = asyncio.Semaphore(concurrency or UKIYOE_PAGE_CONCURRENCY)
+
+    async def fetch_page(start: int) -> tuple[int, Feed]:
+        async with semaphore:
+            return start, await single_flight.do(
+                f"ukiyo-e:{category}:page={start}",
+                lambda: get_ukiyo_e_feed(category, start),
+                model=Feed,
+            )
+
+    tasks = [
+        asyncio.create_task(fetch_page(start))
+        for start in _page_starts(pages or UKIYOE_PAGES)
+    ]
+    try:
+        for next_page in asyncio.as_completed(tasks):
+            try:
+                yield await next_page
+            except Exception as e:
+                print(f"Failed to fetch ukiyo-e page for {category}: {e}")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def get_ukiyo_e_pages(
+    category: str, pages: int | None = None, concurrency: int | None = None
+) -> Feed:
+    """
+    Fetch several pages of a feed concurrently (see `iter_ukiyo_e_pages`) and
+    combine them in page order.
+
+    Returns whatever pages succeeded; only raises if every page failed.
+    """
+    fetched = sorted(
+        [page async for page in iter_ukiyo_e_pages(category, pages, concurrency)],
+        key=lambda page: page[0],
+    )
+    if not fetched:
+        raise Exception(f"Failed to fetch every ukiyo-e page for {category}")
+    items = [item for _, feed in fetched for item in feed.items]
+    return Feed(items=items, category=fetched[0][1].category)
+
+
+def _parse_ukiyo_e_page(content: bytes, cluster_category: str | None) -> list[FeedItem]:
+    json_data = orjson.loads(content)
+    return cluster_items(json_data, cluster_category)
+
+
 if __name__ == "__main__":
-    items = get_ukiyo_e_feed("mfa")
+    import asyncio
+
+    items = asyncio.run(get_ukiyo_e_pages("mfa"))
     print(items)
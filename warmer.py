@@ -0,0 +1,146 @@
+"""
+Background cache warmer for the feeds visitors are most likely to ask for.
+
+Every WARMER_INTERVAL seconds, the first few categories of each media source,
+plus any hot categories, are fetched into the feed cache if they are missing or
+about to go stale. Sources are warmed concurrently, but the categories of one
+source one after another with a pause in between, so the warmer never hammers a
+single upstream host. Request counts decay after every pass, so the most
+requested feeds are the recently popular ones.
+
+The warmer is opt-in. When Redis is configured, each pass is run by whichever
+worker takes the pass's Redis lock first, so running several workers doesn't
+multiply the upstream requests.
+
+Configuration (environment variables):
+  - WARMER_INTERVAL: seconds between warming runs, 0 disables the warmer (default 0)
+  - WARMER_TOP_N: number of categories warmed per source, in the order the
+    source lists them (default 3)
+  - WARMER_HOT_CATEGORIES: comma-separated extra feeds to keep warm, as
+    source:category, e.g. "reddit:analog,wikiart:artist:claude-monet"
+  - WARMER_HOT_FROM_STATS: number of most requested feeds to keep warm as well
+    (default 10)
+  - WARMER_SOURCE_DELAY: seconds between two warm fetches from the same source (default 2)
+"""
+
+import asyncio
+import inspect
+import os
+from typing import Optional
+
+from feeds import FEED_SOURCES, decay_feed_access, feed_access, warm_feed
+from models import CATEGORY_FETCHERS
+
+WARMER_INTERVAL = float(os.getenv("WARMER_INTERVAL", 0))
+WARMER_TOP_N = int(os.getenv("WARMER_TOP_N", 3))
+WARMER_HOT_FROM_STATS = int(os.getenv("WARMER_HOT_FROM_STATS", 10))
+WARMER_SOURCE_DELAY = float(os.getenv("WARMER_SOURCE_DELAY", 2))
+
+# Categories that aren't a feed of their own
+SKIPPED_CATEGORIES = {("wikiart", "random-artist")}
+
+# Redis client used to elect the worker that runs each pass, see `configure_warmer`
+_redis = None
+
+
+def configure_warmer(redis) -> None:
+    """Run each warming pass in only one of the workers sharing this Redis client."""
+    global _redis
+    _redis = redis
+
+
+async def _elected(interval: float) -> bool:
+    """Whether this worker should run the current pass."""
+    if _redis is None:
+        return True
+    try:
+        # Expires just before the next pass, so every pass elects a worker again
+        return bool(
+            await _redis.set("bijukaru:warmer", "1", nx=True, px=max(int(interval * 900), 1))
+        )
+    except Exception as e:
+        print(f"Cache warmer election failed, warming anyway: {e}")
+        return True
+
+
+def parse_hot_categories(value: str) -> list[tuple[str, str]]:
+    """Parse a WARMER_HOT_CATEGORIES value into (source, category) pairs."""
+    hot = []
+    for entry in value.split(","):
+        source, _, category = entry.strip().partition(":")
+        if source in FEED_SOURCES and category:
+            hot.append((source, category))
+        elif entry.strip():
+            print(f"Ignoring unknown hot category for the cache warmer: {entry}")
+    return hot
+
+
+WARMER_HOT_CATEGORIES = parse_hot_categories(os.getenv("WARMER_HOT_CATEGORIES", ""))
+
+
+async def top_categories(source: str, n: int) -> list[str]:
+    """The ids of the first `n` categories of a media source."""
+    categories = CATEGORY_FETCHERS[source]()
+    if inspect.isawaitable(categories):
+        categories = await categories
+    ids = [c.id for c in categories if (source, c.id) not in SKIPPED_CATEGORIES]
+    return ids[:n]
+
+
+async def categories_to_warm(
+    top_n: int = WARMER_TOP_N,
+    hot: Optional[list[tuple[str, str]]] = None,
+) -> dict[str, list[str]]:
+    """
+    The categories to warm per source: the top `top_n` of each source, then the
+    `hot` ones (by default, the configured and the most requested ones).
+    """
+    if hot is None:
+        hot = WARMER_HOT_CATEGORIES + [
+            feed for feed, _ in feed_access.most_common(WARMER_HOT_FROM_STATS)
+        ]
+    to_warm: dict[str, list[str]] = {source: [] for source in FEED_SOURCES}
+    for source in FEED_SOURCES:
+        try:
+            to_warm[source] = await top_categories(source, top_n)
+        except Exception as e:
+            print(f"Cache warmer could not list the {source} categories: {e}")
+    for source, category in hot:
+        if category not in to_warm[source] and (source, category) not in SKIPPED_CATEGORIES:
+            to_warm[source].append(category)
+    return to_warm
+
+
+async def _warm_source(source: str, categories: list[str], within: float) -> int:
+    warmed = 0
+    for category in categories:
+        try:
+            if await warm_feed(source, category, within=within):
+                warmed += 1
+                await asyncio.sleep(WARMER_SOURCE_DELAY)
+        except Exception as e:
+            print(f"Cache warmer failed to fetch {source}:{category}: {e}")
+    return warmed
+
+
+async def warm_once(within: float = WARMER_INTERVAL) -> int:
+    """Run one warming pass, returning the number of feeds fetched."""
+    to_warm = await categories_to_warm()
+    warmed = await asyncio.gather(
+        *(_warm_source(source, categories, within) for source, categories in to_warm.items())
+    )
+    return sum(warmed)
+
+
+async def run_warmer(interval: float = WARMER_INTERVAL) -> None:
+    """Warm the cache every `interval` seconds, until cancelled."""
+    while True:
+        try:
+            if await _elected(interval):
+                warmed = await warm_once(within=interval)
+                if warmed:
+                    print(f"Cache warmer fetched {warmed} feeds")
+        except Exception as e:
+            print(f"Cache warmer run failed: {e}")
+        decay_feed_access()
+        await asyncio.sleep(interval)
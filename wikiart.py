@@ -1,10 +1,13 @@
-import requests
+from http_client import USER_AGENT, get_async_client
+import httpx
 import random
 from pydantic import BaseModel, Field, AliasPath, AliasChoices
 from typing import Any, Optional
 from schema import FeedItem, Category, Feed
 import re
 from functools import lru_cache
+from cache import cached
+from workers import run_in_worker
 from urllib.parse import quote as urlquote
 
 class WikiArtArtwork(BaseModel):
@@ -121,16 +124,15 @@ def get_wikiart_categories() -> list[WikiArtCategory]:
     )
 
 
-@lru_cache(maxsize=1)
-def get_popular_artists() -> list[str]:
+@cached("wikiart-popular-artists", ttl=60 * 60 * 24)
+async def get_popular_artists() -> list[str]:
     """Get a list of popular artists."""
     url = "https://www.wikiart.org/en/app/api/popularartists?json=1"
-    response = requests.get(url)
+    response = await get_async_client().get(url)
     return [artist["url"] for artist in response.json()]
 
 
-@lru_cache(maxsize=1024)
-def get_wikiart_feed(category: str, hd: bool = False) -> Feed:
+async def get_wikiart_feed(category: str, hd: bool = False) -> Feed:
     """Fetch artworks for a specific artist from WikiArt.
 
     Args:
@@ -142,7 +144,7 @@ def get_wikiart_feed(category: str, hd: bool = False) -> Feed:
     """
 
     if category.startswith("search:"):
-        return search_wikiart(category.replace("search:", ""))
+        return await search_wikiart(category.replace("search:", ""))
 
     url = "https://www.wikiart.org"
     if category == "most-viewed":
@@ -153,21 +155,21 @@ def get_wikiart_feed(category: str, hd: bool = False) -> Feed:
         url = f"https://www.wikiart.org/en/paintings-by-style/{category.replace('style:', '')}?select=featured&json=2&quantity=50"
 
     # Spoof a browser request
-    response = requests.get(
-        url,
-        headers={
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        },
-    )
+    response = await get_async_client().get(url, headers={"User-Agent": USER_AGENT})
 
     if response.status_code != 200:
         raise Exception(
             f"Failed to fetch WikiArt feed for artist {category}. Status code: {response.status_code}"
         )
 
+    # Decoding and validating the artworks is CPU-bound, keep it off the event loop
+    return await run_in_worker(_parse_wikiart_feed, response, category)
+
+
+def _parse_wikiart_feed(response: httpx.Response, category: str) -> Feed:
     try:
         response_data = response.json()
-    except requests.exceptions.JSONDecodeError as e:
+    except ValueError as e:
         print(
             f"Error decoding JSON from WikiArt API. Response text: {response.text[:200]}..."
         )
@@ -214,6 +216,8 @@ def get_wikiart_feed(category: str, hd: bool = False) -> Feed:
                 image_url=artwork.image_url,
                 link=artwork.link,
                 artist_name=artwork.artistName,
+                width=artwork.width,
+                height=artwork.height,
             )
         )
 
@@ -232,34 +236,52 @@ def get_wikiart_feed(category: str, hd: bool = False) -> Feed:
     )
 
 
-def search_wikiart_for_artists(artists: list[str]) -> list[WikiArtCategory]:
+async def search_wikiart_for_artists(artists: list[str]) -> list[WikiArtCategory]:
     """Search for artworks on WikiArt for a specific artist."""
     categories = []
     for artist in artists:
         url = f"https://www.wikiart.org/en/Search/{urlquote(artist)}?json=2&layout=new&limit=100&resultType=masonry"
-        response = requests.get(url)
+        response = await get_async_client().get(url)
         if response.status_code != 200:
             raise Exception(
                 f"Failed to fetch WikiArt feed for artist {artist}. Status code: {response.status_code}"
             )
-        response_data = response.json()
-        if "Artists" not in response_data:
-            raise Exception(
-                f"Expected 'Artists' key in response for search query {artist}"
-            )
-        artist_response = response_data["Artists"]
-        if artist_response is not None:
-            categories.append(
-                WikiArtCategory(
-                    id="artist:" + artist_response[0]["url"].split("/")[-1],
-                    name=artist_response[0]["title"],
-                )
-            )
+        category = await run_in_worker(_parse_artist_search, response, artist)
+        if category is not None:
+            categories.append(category)
     return categories
 
 
-@lru_cache(maxsize=1024)
-def search_wikiart(query: str) -> Feed:
+def _parse_artist_search(response: httpx.Response, artist: str) -> Optional[WikiArtCategory]:
+    response_data = response.json()
+    if "Artists" not in response_data:
+        raise Exception(
+            f"Expected 'Artists' key in response for search query {artist}"
+        )
+    artist_response = response_data["Artists"]
+    if artist_response is None:
+        return None
+    return WikiArtCategory(
+        id="artist:" + artist_response[0]["url"].split("/")[-1],
+        name=artist_response[0]["title"],
+    )
+
+
+def _parse_artwork_search(response: httpx.Response, query: str) -> list[WikiArtArtwork]:
+    response_data = response.json()
+    if "Paintings" not in response_data:
+        raise Exception(
+            f"Expected 'Paintings' key in response for search query {query}"
+        )
+    if response_data["Paintings"] is None:
+        return []
+    return [
+        WikiArtArtwork.model_validate(artwork)
+        for artwork in response_data["Paintings"]
+    ]
+
+
+async def search_wikiart(query: str) -> Feed:
     """Search for artworks on WikiArt.
 
     Args:
@@ -278,24 +300,13 @@ def search_wikiart(query: str) -> Feed:
     for _query in queries:
         _query = _query.strip()
         url = f"https://www.wikiart.org/en/Search/{urlquote(_query)}?json=2&layout=new&limit=100&resultType=masonry"
-        response = requests.get(url)
+        response = await get_async_client().get(url)
         if response.status_code != 200:
             raise Exception(
                 f"Failed to fetch WikiArt feed for artist {_query}. Status code: {response.status_code}"
             )
-        response_data = response.json()
-        if "Paintings" not in response_data:
-            raise Exception(
-                f"Expected 'Paintings' key in response for search query {_query}"
-            )
-
-        if response_data["Paintings"] is None:
-            artworks += []
-        else:
-            artworks += [
-                WikiArtArtwork.model_validate(artwork)
-                for artwork in response_data["Paintings"]
-            ]
+        # Decoding and validating the artworks is CPU-bound, keep it off the event loop
+        artworks += await run_in_worker(_parse_artwork_search, response, _query)
     return Feed(
         items=[
             FeedItem(
@@ -309,6 +320,8 @@ def search_wikiart(query: str) -> Feed:
                 image_url=artwork.image_url,
                 link=artwork.link,
                 artist_name=artwork.artistName,
+                width=artwork.width,
+                height=artwork.height,
             )
             for artwork in artworks
         ],
@@ -319,4 +332,6 @@ def search_wikiart(query: str) -> Feed:
 
 
 if __name__ == "__main__":
-    print(get_wikiart_feed("rene-magritte"))
+    import asyncio
+
+    print(asyncio.run(get_wikiart_feed("artist:rene-magritte")))
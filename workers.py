@@ -0,0 +1,45 @@
+"""
+Bounded worker pools for CPU-bound work (HTML/JSON parsing, model validation).
+
+Fetching is async, but parsing a large Guardian gallery or a Reddit listing still
+takes real CPU time. Running it on the event loop thread would stall every other
+request on the worker, so it is handed off to a small, fixed-size thread pool.
+
+Resizing and re-encoding images for the image proxy is much slower than parsing
+a feed, so it gets a pool of its own: a burst of image requests then can't hold
+every parse worker and stall the feeds.
+
+Configuration (environment variables):
+  - PARSE_WORKERS: number of worker threads for parsing (default 4)
+  - IMAGE_WORKERS: number of worker threads for image work (default 2)
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PARSE_WORKERS", "4")),
+    thread_name_prefix="bijukaru-parse",
+)
+
+_image_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("IMAGE_WORKERS", "2")),
+    thread_name_prefix="bijukaru-image",
+)
+
+
+async def run_in_worker(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run `func(*args, **kwargs)` in the bounded worker pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+async def run_in_image_worker(func: Callable[..., T], *args, **kwargs) -> T:
+    """Like `run_in_worker`, in the pool for image transforms and image file I/O."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_image_executor, partial(func, *args, **kwargs))